@@ -1,5 +1,7 @@
 from src.pipeline import Jarvis
 from src.timing import timer
+from src.profiler import install_signal_handler
+from src.config import PROFILE_TURNS
 import argparse
 
 def main():
@@ -17,11 +19,44 @@ def main():
         default=True,
         help='Run in continuous conversation mode (default)'
     )
+    parser.add_argument(
+        '--replay',
+        metavar='DIR',
+        help='Replay the .wav utterances in DIR instead of using the microphone, then print a latency report'
+    )
+    parser.add_argument(
+        '--replay-output',
+        metavar='DIR',
+        default='replay_output',
+        help='Where --replay writes the spoken responses (default: replay_output)'
+    )
+    parser.add_argument(
+        '--mock',
+        action='store_true',
+        help='With --replay, use the local Ollama and Piper stand-ins from src/mock.py'
+    )
+    parser.add_argument(
+        '--profile',
+        metavar='TURNS',
+        type=int,
+        nargs='?',
+        const=PROFILE_TURNS,
+        help=f'Sample every thread\'s stack for TURNS turns (default {PROFILE_TURNS}) and write collapsed stacks to profiles/'
+    )
     args = parser.parse_args()
 
+    if args.replay:
+        from src.replay import run_replay
+        run_replay(args.replay, args.replay_output, mock=args.mock, profile=args.profile)
+        return
+
     assistant = Jarvis()
+    # kill -USR1 <pid> profiles a running assistant without restarting it
+    install_signal_handler(assistant.profiler)
+    if args.profile:
+        assistant.profiler.start(args.profile)
     with timer.section("startup"):
-        assistant.initialize()
+        assistant.initialize(wake_word=args.wake_word)
     timer.report()
     if args.wake_word:
         assistant.run_with_wake_word()
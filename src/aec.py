@@ -0,0 +1,118 @@
+import threading
+import numpy as np
+from src.config import (
+    AEC_BLOCK_SIZE, AEC_FILTER_LENGTH, AEC_STEP_SIZE, AEC_WARMUP_BLOCKS, AEC_DOUBLETALK_RATIO,
+    AEC_MIN_ADAPTED_BLOCKS, AEC_CONVERGED_ERLE
+)
+
+class EchoCanceller:
+    """
+    partitioned-block frequency-domain NLMS echo canceller (overlap-save)
+    the TTS audio we hand to the speaker is the reference signal, its echo through the room is
+    estimated with an adaptive filter and subtracted from the mic so mostly the user's voice is left.
+    reference and mic are aligned on the capture ring buffer's sample positions, the filter length
+    has to cover the output latency plus the room's echo tail. mic chunks should be a multiple of the block size
+    """
+    def __init__(self, block_size=AEC_BLOCK_SIZE, filter_length=AEC_FILTER_LENGTH, step_size=AEC_STEP_SIZE):
+        self.block_size = block_size
+        self.num_partitions = -(-filter_length // block_size)
+        self.step_size = step_size
+        self.lock = threading.Lock()
+        self.segments = [] # (start_pos, float pcm) of audio that was sent to the speaker
+        self.reset()
+
+    def reset(self):
+        """forget the learned echo path"""
+        bins = self.block_size + 1
+        self.weights = np.zeros((self.num_partitions, bins), dtype=np.complex128)
+        self.ref_spectra = np.zeros((self.num_partitions, bins), dtype=np.complex128) # newest first
+        self.prev_ref_block = np.zeros(self.block_size)
+        self.blocks_adapted = 0
+        self.erle = 0.0 # smoothed dB of echo removed while adapting (echo return loss enhancement)
+        self.noise_power = None # smoothed mic power with no playback in the filter's span
+        self.echo_power = None # smoothed mic power during playback
+        self.echo_active = False # whether the last process() call had playback within the filter's span
+
+    @property
+    def converged(self):
+        """
+        True once the filter has removed enough echo that what's left of it won't be mistaken for the user,
+        or the echo barely rises above the room noise in the first place
+        """
+        if self.blocks_adapted < AEC_MIN_ADAPTED_BLOCKS:
+            return False
+        if self.erle >= AEC_CONVERGED_ERLE:
+            return True
+        return self.noise_power is not None and self.echo_power < 2 * self.noise_power
+
+    def add_reference(self, pcm, start_pos):
+        """register int16 playback audio that starts at capture position start_pos"""
+        with self.lock:
+            self.segments.append((start_pos, pcm.astype(np.float64)))
+
+    def truncate_reference(self, pos):
+        """playback was stopped at capture position pos, nothing after it reaches the speaker"""
+        with self.lock:
+            self.segments = [(start, pcm[:max(0, pos - start)]) for start, pcm in self.segments if pos > start]
+
+    def reference(self, pos, num_samples):
+        """the playback signal for capture positions [pos, pos + num_samples)"""
+        ref = np.zeros(num_samples)
+        with self.lock:
+            # segments that ended before this chunk can never be needed again
+            self.segments = [(start, pcm) for start, pcm in self.segments if start + len(pcm) > pos]
+            for start, pcm in self.segments:
+                lo = max(pos, start)
+                hi = min(pos + num_samples, start + len(pcm))
+                if lo < hi:
+                    ref[lo - pos:hi - pos] = pcm[lo - start:hi - start]
+        return ref
+
+    def process(self, mic, pos):
+        """remove the playback echo from an int16 mic chunk captured at position pos, returns the residual"""
+        mic = mic.astype(np.float64)
+        ref = self.reference(pos, len(mic))
+        residual = mic.copy()
+        self.echo_active = False
+        for i in range(0, len(mic) - self.block_size + 1, self.block_size):
+            block = slice(i, i + self.block_size)
+            residual[block] = self.process_block(mic[block], ref[block])
+        return residual
+
+    def process_block(self, d, x):
+        """one overlap-save step, d is the mic block and x the reference block"""
+        n = self.block_size
+        X = np.fft.rfft(np.concatenate((self.prev_ref_block, x)))
+        self.prev_ref_block = x
+        self.ref_spectra = np.roll(self.ref_spectra, 1, axis=0)
+        self.ref_spectra[0] = X
+        y = np.fft.irfft((self.weights * self.ref_spectra).sum(axis=0))[n:]
+        e = d - y
+
+        ref_power = (np.abs(self.ref_spectra) ** 2).sum(axis=0)
+        mic_power = np.dot(d, d) / n
+        if not ref_power.any():
+            # nothing played within the filter's span, the mic only hears the room
+            self.noise_power = mic_power if self.noise_power is None else self.noise_power + 0.05 * (mic_power - self.noise_power)
+            return e
+        self.echo_active = True
+        self.echo_power = mic_power if self.echo_power is None else self.echo_power + 0.05 * (mic_power - self.echo_power)
+        if not x.any():
+            return e
+        # freeze adaptation during double talk, otherwise the filter learns to cancel the user.
+        # until the filter removes a good part of the echo its estimate y is too small to tell double talk
+        # from an unlearned echo path, checking earlier can freeze it before it ever converges
+        echo_energy = np.dot(y, y)
+        learned = self.blocks_adapted >= AEC_WARMUP_BLOCKS and self.erle >= AEC_CONVERGED_ERLE / 2
+        if learned and np.dot(e, e) > AEC_DOUBLETALK_RATIO * echo_energy:
+            return e
+        E = np.fft.rfft(np.concatenate((np.zeros(n), e)))
+        gradient = np.conj(self.ref_spectra) * E / (ref_power + 1e-3 * ref_power.mean() + 1e-6)
+        # gradient constraint keeps each partition a causal block_size tap filter
+        g = np.fft.irfft(gradient, axis=1)
+        g[:, n:] = 0
+        self.weights += self.step_size * np.fft.rfft(g, axis=1)
+        self.blocks_adapted += 1
+        erle = np.clip(10 * np.log10((np.dot(d, d) + 1e-6) / (np.dot(e, e) + 1e-6)), -10, 60)
+        self.erle += 0.05 * (erle - self.erle)
+        return e
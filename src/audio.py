@@ -1,18 +1,125 @@
 import pyaudio
 import numpy as np
+import threading
 import time
-from src.config import SAMPLE_RATE, CHUNK_SIZE, CHANNELS, SILENCE_DURATION, VAD_THRESHOLD
+from src.config import (
+    SAMPLE_RATE, CHUNK_SIZE, CHANNELS,
+    RING_BUFFER_SECONDS, CAPTURE_READ_TIMEOUT, PREROLL_MS, RECORD_SECONDS
+)
 from src.timing import timer
+from src.vad import make_vad, Endpointer
+
+INT16_SCALE = np.float32(1 / 32768.0)
+
+def convert_into(dst, src):
+    """write int16 samples into dst, converting to float32 in [-1, 1] on the way if dst is float"""
+    if dst.dtype == np.int16:
+        dst[:] = src
+    else:
+        np.multiply(src, INT16_SCALE, out=dst)
+
+class RingBuffer:
+    """
+    single-producer, multi-consumer ring buffer of int16 samples
+    the capture thread is the only writer and every consumer keeps its own read position,
+    so readers never block the writer or each other (the condition is only used to wake readers up)
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity, dtype=np.int16)
+        self.write_pos = 0 # absolute count of samples ever written
+        self.data_ready = threading.Condition()
+
+    def write(self, samples):
+        """copy samples in, then publish the new write position"""
+        n = len(samples)
+        start = self.write_pos % self.capacity
+        end = start + n
+        if end <= self.capacity:
+            self.buffer[start:end] = samples
+        else:
+            split = self.capacity - start
+            self.buffer[start:] = samples[:split]
+            self.buffer[:end - self.capacity] = samples[split:]
+        self.write_pos += n
+        with self.data_ready:
+            self.data_ready.notify_all()
+
+    def copy_into(self, pos, out):
+        """copy len(out) samples starting at absolute position pos into out (int16, or float32 scaled to [-1, 1])"""
+        start = pos % self.capacity
+        end = start + len(out)
+        if end <= self.capacity:
+            convert_into(out, self.buffer[start:end])
+        else:
+            split = self.capacity - start
+            convert_into(out[:split], self.buffer[start:])
+            convert_into(out[split:], self.buffer[:end - self.capacity])
+
+    def oldest_pos(self):
+        """absolute position of the oldest sample that hasn't been overwritten yet"""
+        return max(0, self.write_pos - self.capacity)
+
+class AudioReader:
+    """an independent consumer of the shared capture ring buffer"""
+    def __init__(self, ring, pos):
+        self.ring = ring
+        self.pos = pos
+
+    def read(self, num_samples=CHUNK_SIZE, timeout=CAPTURE_READ_TIMEOUT):
+        """blocks until num_samples new samples are captured and returns them as int16"""
+        out = np.empty(num_samples, dtype=np.int16)
+        self.read_into(out, timeout)
+        return out
+
+    def read_into(self, out, timeout=CAPTURE_READ_TIMEOUT):
+        """blocks until len(out) new samples are captured and writes them straight into out"""
+        ring = self.ring
+        num_samples = len(out)
+        while True:
+            if ring.write_pos < self.pos + num_samples:
+                with ring.data_ready:
+                    if not ring.data_ready.wait_for(lambda: ring.write_pos >= self.pos + num_samples, timeout):
+                        raise TimeoutError("no audio from the capture thread")
+            # a slow reader that got lapped by the writer skips ahead to the oldest intact audio
+            if self.pos < ring.oldest_pos():
+                print(f"Audio reader overrun, skipping {ring.oldest_pos() - self.pos} samples")
+                self.pos = ring.oldest_pos()
+                continue
+            ring.copy_into(self.pos, out)
+            # the writer may have lapped us while copying, if so the copy is torn and we retry
+            if self.pos < ring.oldest_pos():
+                continue
+            self.pos += num_samples
+            return out
+
+    def skip_to_latest(self):
+        """drop any unread audio, the next read returns freshly captured samples"""
+        self.pos = self.ring.write_pos
 
 class AudioInterface:
     def __init__(self):
-        self.audio = pyaudio.PyAudio()
+        self.audio = None
         self.stream = None
-        
-    def start_recording(self):
-        """opens the microphone stream"""
-        if self.stream:
-            self.stop_recording()
+        self.ring = RingBuffer(int(RING_BUFFER_SECONDS * SAMPLE_RATE))
+        self.capturing = False
+        self.capture_thread = None
+        self.vad = make_vad()
+        # recordings are written straight into this float32 buffer, so Whisper gets a view with no copies
+        self.record_buffer = np.zeros(int((RECORD_SECONDS + 1) * SAMPLE_RATE), dtype=np.float32)
+
+    def start_capture(self):
+        """opens the microphone stream once and starts the capture thread that owns it"""
+        if self.capturing:
+            return
+        self.open_stream()
+        self.capturing = True
+        self.capture_thread = threading.Thread(target=self.capture_loop, daemon=True)
+        self.capture_thread.start()
+
+    def open_stream(self):
+        if self.audio is None:
+            self.audio = pyaudio.PyAudio()
         self.stream = self.audio.open(
             format=pyaudio.paInt16,
             channels=CHANNELS,
@@ -20,9 +127,28 @@ class AudioInterface:
             input=True,
             frames_per_buffer=CHUNK_SIZE
         )
-    
-    def stop_recording(self):
-        """closes the microphone stream"""
+
+    def read_chunk(self):
+        """the next CHUNK_SIZE captured samples as int16, blocks until they're available"""
+        data = self.stream.read(CHUNK_SIZE, exception_on_overflow=False)
+        return np.frombuffer(data, dtype=np.int16)
+
+    def capture_loop(self):
+        """the only place the microphone is read from (runs in background thread)"""
+        while self.capturing:
+            try:
+                self.ring.write(self.read_chunk())
+            except Exception as e:
+                if self.capturing:
+                    print(f"Capture error: {e}")
+                    time.sleep(0.01)
+
+    def stop_capture(self):
+        """stops the capture thread and closes the microphone stream"""
+        self.capturing = False
+        if self.capture_thread and self.capture_thread.is_alive():
+            self.capture_thread.join(timeout=1.0)
+        self.capture_thread = None
         if self.stream:
             try:
                 self.stream.stop_stream()
@@ -31,49 +157,66 @@ class AudioInterface:
                 pass
             finally:
                 self.stream = None
-    
+
+    def reader(self, start_pos=None, preroll_ms=0):
+        """
+        returns a new consumer of the capture thread
+        it starts at start_pos (default: the most recently captured sample) minus preroll_ms of history
+        """
+        self.start_capture()
+        if start_pos is None:
+            start_pos = self.ring.write_pos
+        start_pos -= int(preroll_ms * SAMPLE_RATE / 1000)
+        return AudioReader(self.ring, max(start_pos, self.ring.oldest_pos()))
+
     @timer.measure("recording")
-    def record_until_silence(self, max_seconds=5):
+    def record_until_silence(self, max_seconds=5, start_pos=None, preroll_ms=PREROLL_MS, on_chunk=None, endpointer=None, prefix=None):
         """
         records audio until the user stops speaking or for up to 5 seconds (whichever comes first)
-        sends captured audio to Whisper
+        start_pos lets the recording continue from an exact capture position (eg right after the wake word),
+        without one the last preroll_ms of audio is prepended so nothing said just before listening started is lost
+        on_chunk is called with a float32 view of every chunk as it's recorded (used for streaming STT)
+        endpointer decides when the utterance is over, pass one in to feed it partial transcripts
+        prefix is float32 audio (a multiple of CHUNK_SIZE) that's recorded first, in place of what the mic heard before start_pos
+        returns a float32 view into the shared record buffer, it's only valid until the next recording
         """
-        self.start_recording()
-        frames = []
-        num_cons_schunks = 0
-        num_schunks_to_end_rec = int(SILENCE_DURATION * SAMPLE_RATE / CHUNK_SIZE)
-        max_chunks = int(max_seconds * SAMPLE_RATE / CHUNK_SIZE)
-        any_speech_detected = False
+        # an exact start position is already where the user's words begin, pre-roll would reach back into the wake word
+        reader = self.reader(start_pos=start_pos, preroll_ms=preroll_ms if start_pos is None else 0)
+        if endpointer is None:
+            endpointer = Endpointer(CHUNK_SIZE / SAMPLE_RATE)
+        self.vad.reset()
+        prefix = np.zeros(0, dtype=np.float32) if prefix is None else prefix
+        # the pre-roll and prefix don't eat into the max recording time
+        max_chunks = int((max_seconds * SAMPLE_RATE + (reader.ring.write_pos - reader.pos) + len(prefix)) / CHUNK_SIZE)
+        if len(self.record_buffer) < max_chunks * CHUNK_SIZE:
+            self.record_buffer = np.zeros(max_chunks * CHUNK_SIZE, dtype=np.float32)
+        num_samples = 0
         for i in range(max_chunks):
             try:
-                data = self.stream.read(CHUNK_SIZE, exception_on_overflow=False)
-                frames.append(data)
-                # Check volume for VAD
-                audio_chunk = np.frombuffer(data, dtype=np.int16)
-                volume = np.abs(audio_chunk).mean()
-                # Check if we ever detect speech
-                if volume >= VAD_THRESHOLD * 1000:
-                    any_speech_detected = True
-                    num_cons_schunks = 0
+                audio_chunk = self.record_buffer[num_samples:num_samples + CHUNK_SIZE]
+                if num_samples < len(prefix):
+                    audio_chunk[:] = prefix[num_samples:num_samples + CHUNK_SIZE]
                 else:
-                    num_cons_schunks += 1
-                    if any_speech_detected and num_cons_schunks == num_schunks_to_end_rec:
-                        print("Silence detected, ending recording")
-                        break
+                    reader.read_into(audio_chunk)
+                num_samples += CHUNK_SIZE
+                if on_chunk:
+                    on_chunk(audio_chunk)
+                if endpointer.update(self.vad.is_speech(audio_chunk)):
+                    print(f"Silence detected ({endpointer.silence:.1f}s), ending recording")
+                    break
             except Exception as e:
                 print(f"Recording error: {e}")
-                break  
-        self.stop_recording()
+                break
         # Whisper requires a tensor of 32-bit fp numbers
-        if not any_speech_detected:
+        if not endpointer.any_speech_detected:
             print("No speech detected - returning silence")
             return np.zeros(1600, dtype=np.float32)
-        audio_data = np.frombuffer(b''.join(frames), dtype=np.int16)
-        return audio_data.astype(np.float32) / 32768.0
-    
+        return self.record_buffer[:num_samples]
+
     def shutdown(self):
-        self.stop_recording()
-        self.audio.terminate()
+        self.stop_capture()
+        if self.audio:
+            self.audio.terminate()
 
 # Test code
 if __name__ == "__main__":
@@ -84,4 +227,4 @@ if __name__ == "__main__":
         print(f"Recorded {len(audio_data)/SAMPLE_RATE:.1f} seconds")
         timer.report()
     finally:
-        audio.shutdown()
\ No newline at end of file
+        audio.shutdown()
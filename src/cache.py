@@ -0,0 +1,103 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from src.speculate import normalize_transcript
+from src.config import CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, CACHE_TTL, CACHE_FUZZY_THRESHOLD
+
+# prompts that refer back to the conversation can't be answered from a cache
+CONTEXT_DEPENDENT = re.compile(
+    r"\b(it|its|it's|that|that's|this|those|these|they|them|their|he|his|she|him|her|again|more|another|other|else|"
+    r"previous|before|earlier|same|remember|my name)\b"
+)
+
+# words that don't change what's being asked, so "can you tell me a joke" and "tell me a joke" are the same question
+FILLER = {
+    "a", "an", "the", "please", "hey", "jarvis", "can", "could", "would", "will", "you", "me", "us", "i",
+    "tell", "give", "what", "what's", "whats", "is", "are", "do", "does", "some", "just", "now", "okay", "ok", "so"
+}
+
+class ResponseCache:
+    """
+    LRU + TTL cache of complete responses (text and the synthesized PCM) keyed on normalized transcripts
+    size is bounded both by entries and by total bytes of audio, near-identical transcripts can match fuzzily
+    """
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL, fuzzy_threshold=CACHE_FUZZY_THRESHOLD):
+        self.entries = OrderedDict() # key -> (expires_at, text, (text, pcm) chunks, bytes), oldest first
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.fuzzy_threshold = fuzzy_threshold # None disables fuzzy matching
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def cacheable(self, prompt):
+        """False for prompts whose answer depends on the conversation so far"""
+        key = normalize_transcript(prompt)
+        return bool(key) and not CONTEXT_DEPENDENT.search(key)
+
+    def get(self, prompt):
+        """(text, chunks) for a cached response to this prompt, or None, chunks are (text, pcm) in playing order"""
+        key = normalize_transcript(prompt)
+        with self.lock:
+            self.expire()
+            match = key if key in self.entries else self.fuzzy_match(key)
+            if match is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(match)
+            self.hits += 1
+            _, text, chunks, _ = self.entries[match]
+            return text, chunks
+
+    def fuzzy_match(self, key):
+        """
+        a cached key that only differs from key in filler words, compared word by word: a different number, name
+        or any other content word is a different question however similar the characters are
+        """
+        if self.fuzzy_threshold is None:
+            return None
+        words = key.split()
+        content = content_words(words)
+        best, best_ratio = None, self.fuzzy_threshold
+        for candidate in self.entries:
+            candidate_words = candidate.split()
+            if content_words(candidate_words) != content:
+                continue
+            ratio = SequenceMatcher(None, words, candidate_words).ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = candidate, ratio
+        return best
+
+    def put(self, prompt, text, chunks):
+        key = normalize_transcript(prompt)
+        size = sum(pcm.nbytes for _, pcm in chunks)
+        if not key or size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (time.monotonic() + self.ttl, text, chunks, size)
+            self.bytes += size
+            # evict least recently used until both bounds hold
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                self.remove(next(iter(self.entries)))
+
+    def remove(self, key):
+        self.bytes -= self.entries.pop(key)[3]
+
+    def expire(self):
+        now = time.monotonic()
+        for key in [key for key, entry in self.entries.items() if entry[0] <= now]:
+            self.remove(key)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups * 100 if lookups else 0
+        return f"{self.hits}/{lookups} hits ({hit_rate:.0f}%), {len(self.entries)} entries, {self.bytes / 1e6:.1f}MB of audio"
+
+def content_words(words):
+    return [word for word in words if word not in FILLER]
@@ -2,8 +2,35 @@ import platform
 
 # Model settings
 OLLAMA_MODEL = "gemma3:1b-it-qat"
+OLLAMA_URL = "http://localhost:11434"
+OLLAMA_KEEP_ALIVE = "24h"  # how long Ollama keeps the model loaded after a request
+OLLAMA_POOL_SIZE = 4  # pooled keep-alive connections to the Ollama server
+OLLAMA_TIMEOUT = 30  # seconds
+SLM_NUM_PREDICT = 100  # max tokens per response
+SLM_TEMPERATURE = 0.7
+CONTEXT_MAX_TOKENS = 600  # token budget for conversation history (the system prompt isn't counted)
+CONTEXT_EVICT_TO = 0.5  # once over budget, the oldest turns are evicted down to this fraction of it
+CONTEXT_SUMMARY = False  # fold evicted turns into a rolling summary, off by default: on a single-slot Ollama the extra SLM call delays the next turn and replaces the cached chat prefix
+CONTEXT_SUMMARY_TOKENS = 80  # max tokens for the rolling summary
+CONTEXT_MODE = "chat"  # "chat" (/api/chat, reuses the cached prompt prefix across turns) or "generate" (one flat prompt)
 WHISPER_MODEL = "tiny.en"
 WHISPER_DEVICE = "cpu"
+WHISPER_CPU_THREADS = 2
+STREAMING_STT = True  # transcribe while the user is still speaking
+STREAMING_STT_STEP = 0.5  # seconds of new audio between incremental decodes
+STREAMING_STT_MIN_AUDIO = 1.0  # seconds of audio before the first incremental decode
+SPECULATIVE_SLM = True  # start the SLM on a stable partial transcript before endpointing fires
+SPECULATE_MIN_SILENCE = 0.2  # seconds the user has to be quiet before speculating
+SEGMENT_FIRST_MIN_WORDS = 3  # a clause break (, ; :) can end the first spoken chunk after this many words
+SEGMENT_FIRST_MAX_WORDS = 8  # the first chunk is cut after this many words even without punctuation
+SEGMENT_MIN_WORDS = 4  # later sentences shorter than this are merged with the next one
+SEGMENT_SOFT_WORDS = 12  # a clause break can end a later chunk after this many words
+SEGMENT_MAX_WORDS = 25  # later chunks are cut after this many words even without punctuation
+CACHE_ENABLED = True  # replay cached text + audio for repeated questions instead of running the SLM and TTS
+CACHE_MAX_ENTRIES = 64
+CACHE_MAX_BYTES = 32 * 1024 * 1024  # total PCM kept across all entries
+CACHE_TTL = 6 * 60 * 60  # seconds before a cached response goes stale
+CACHE_FUZZY_THRESHOLD = None  # eg 0.6: word similarity for a rephrased transcript (same content words, different filler) to hit, None for exact matches only
 
 # Wake word settings
 WAKE_WORD = "hey_jarvis"  
@@ -15,11 +42,31 @@ SAMPLE_RATE = 16000
 CHUNK_SIZE = 1280 # this is sample rate (16,000 samples per sec) x time window (80 ms)
 CHANNELS = 1
 RECORD_SECONDS = 5  # max recording time
+RING_BUFFER_SECONDS = 10  # how much captured audio the shared ring buffer keeps
+PREROLL_MS = 300  # audio kept from before recording starts, so words right after the wake word aren't lost
+CAPTURE_READ_TIMEOUT = 1.0  # seconds a consumer waits for the capture thread before giving up
 
 # Mic settings
+VAD_BACKEND = "energy"  # "energy" (loudness threshold) or "silero" (onnx model, falls back to energy if it can't be loaded)
+VAD_MODEL_PATH = "models/silero_vad.onnx"  # for "silero": the v5 onnx export from github.com/snakers4/silero-vad, not shipped with the repo
+SILERO_THRESHOLD = 0.5  # speech probability above which a window counts as speech
 VAD_THRESHOLD = 0.5  
-SILENCE_DURATION = 2  # seconds of silence needed to stop recording
-INTERRUPT_POLL_INTERVAL = 0.05  # 50ms
+MIN_SILENCE_DURATION = 0.4  # seconds of silence that end a complete sounding utterance
+SILENCE_DURATION = 1.0  # seconds of silence needed to stop recording when there's no transcript to judge by
+MAX_SILENCE_DURATION = 2.0  # seconds of silence allowed mid-phrase (eg "set a timer for...")
+
+# Echo cancellation (barge-in detection while TTS is playing)
+AEC_BLOCK_SIZE = 256  # samples per filter block, CHUNK_SIZE must be a multiple of this
+AEC_FILTER_LENGTH = 4096  # taps, needs to cover output latency + room echo (~250ms at 16kHz)
+AEC_STEP_SIZE = 0.5  # NLMS step size (0-1), higher adapts faster but is noisier
+AEC_WARMUP_BLOCKS = 20  # blocks that always adapt before double talk detection kicks in
+AEC_DOUBLETALK_RATIO = 4.0  # residual/echo energy ratio above which adaptation freezes
+AEC_MIN_ADAPTED_BLOCKS = 60  # blocks of playback (~1s) the filter must adapt on before interrupts are judged
+AEC_CONVERGED_ERLE = 10.0  # dB of echo removed for the filter to count as converged (or the echo is too weak to matter)
+INTERRUPT_NOISE_RATIO = 3.0  # residual must be this many times the residual noise floor to count as speech
+INTERRUPT_RAW_RATIO = 2.5  # until the echo canceller converges, the raw mic must be this many times its level during playback
+INTERRUPT_RAW_BASELINE_CHUNKS = 3  # chunks of playback the raw level is measured over before the raw check starts
+INTERRUPT_CHUNKS = 2  # consecutive loud chunks needed to trigger an interrupt
 
 # Timing delays (seconds)
 SPEECH_PAUSE_DELAY = 0.1  # pause after stopping speech before new announcement
@@ -32,8 +79,55 @@ MAX_TIMER_DURATION = 3600
 MAX_ALARMS = 5
 
 # Paths
-PIPER_VOICE_PATH = "/home/pi/voices/en_US-amy-low.onnx"
+PIPER_VOICE_PATH = "voices/en_US-amy-low.onnx"  # the .onnx.json config is expected next to it
 
 # TTS settings
+TTS_PREFETCH_SENTENCES = 2  # synthesized PCM chunks waiting for the output, in both SpeechQueue and ResponseTurn
+TTS_MIN_CHUNK_PHONEMES = 40  # long sentences are synthesized and played clause by clause, in pieces at least this long
+TTS_CLI_CHUNK_SECONDS = 0.25  # how much raw audio to read from the piper CLI at a time
+PIPER_NUM_THREADS = 1  # onnxruntime intra-op threads for Piper, leaves the other cores to Whisper
+OUTPUT_FRAMES_PER_BUFFER = 256  # output callback size, also the granularity of stopping playback
+TURN_TEXT_QUEUE_SIZE = 8  # spoken chunks the SLM can get ahead of TTS before it has to wait
+TURN_OUTPUT_CHUNKS_AHEAD = 2  # PCM chunks queued on the output ahead of the one playing
 TTS_RATE = 200  # Words per minute
 TTS_VOLUME = 0.9
+
+# Offline stand-ins (src/mock.py) for benchmarking without Ollama, Piper or audio hardware
+MOCK_OLLAMA_PORT = 11435
+MOCK_TTFT = 0.3  # seconds before the mock server's first token
+MOCK_TOKEN_RATE = 20  # tokens per second after the first
+MOCK_TTS_RTF = 0.3  # fake synthesizer's real-time factor (seconds of compute per second of audio)
+MOCK_SAMPLE_RATE = 16000
+
+# Timing
+TIMER_QUIET = False  # don't print every measurement as it's taken (traces and percentiles are still kept)
+TIMER_MAX_SPANS = 500  # spans kept per turn's trace
+
+# Per-turn latency metrics (end of speech -> first audio), exported for dashboards
+METRICS_ENABLED = True
+METRICS_JSONL_PATH = "metrics/turns.jsonl"  # one JSON line per turn, rotated by size
+METRICS_JSONL_MAX_BYTES = 1024 * 1024
+METRICS_JSONL_BACKUPS = 3
+METRICS_PROM_PATH = "metrics/jarvis.prom"  # Prometheus textfile, point node_exporter's textfile collector at its directory
+METRICS_BUCKETS = [0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 2.5, 3.0, 4.0, 6.0, 10.0]  # seconds, for the latency histograms
+
+# Sampling profiler (main.py --profile, or kill -USR1 <pid> to start/stop it while running)
+PROFILE_INTERVAL = 0.01  # seconds between stack samples of every thread
+PROFILE_TURNS = 5  # turns sampled before the profile is written
+PROFILE_OUTPUT_DIR = "profiles"  # collapsed stacks, one file per run, for flamegraph.pl or speedscope
+PROFILE_MAX_DEPTH = 64  # innermost frames kept per stack
+
+# Resource monitor (src/monitor.py): steps quality down while the Pi is hot or turns are slow, and back up once it recovers
+MONITOR_ENABLED = True
+MONITOR_INTERVAL = 2.0  # seconds between samples of temperature, CPU clock, load and RSS
+MONITOR_TEMP_HOT = 75.0  # degrees C, the Pi 5 starts throttling at 80
+MONITOR_TEMP_COOL = 65.0  # degrees C, quality only steps back up below this
+MONITOR_LATENCY_TARGET = 2.0  # seconds from end of speech to first audio (median of the last few turns)
+MONITOR_LATENCY_TURNS = 3  # turns in the latency median
+MONITOR_STEP_DOWN_WAIT = 10.0  # seconds between steps down, so one change can take effect first
+MONITOR_STEP_UP_WAIT = 60.0  # seconds of continuous headroom (cool, fast, not throttled) before each step back up
+QUALITY_LEVELS = [  # level 0 is the configured quality, each later level is cheaper
+    {"whisper_model": WHISPER_MODEL, "whisper_threads": WHISPER_CPU_THREADS, "num_predict": SLM_NUM_PREDICT, "wake_hop": 1},
+    {"whisper_model": WHISPER_MODEL, "whisper_threads": WHISPER_CPU_THREADS, "num_predict": 60, "wake_hop": 2},
+    {"whisper_model": "tiny.en", "whisper_threads": 1, "num_predict": 40, "wake_hop": 3}
+]  # wake_hop: 80ms wake-word frames per predict() call
@@ -1,12 +1,35 @@
 from collections import deque
 from typing import List, Tuple
 import json
+import re
+import threading
 from src.timing import timer
+from src.config import CONTEXT_MODE, CONTEXT_MAX_TOKENS, CONTEXT_EVICT_TO
+
+def approx_token_count(text):
+    """
+    fast approximate token count, close to a sentencepiece tokenizer for English:
+    every punctuation mark is a token and words cost one token per ~4 characters
+    """
+    return sum(1 if not piece[0].isalnum() else (len(piece) + 3) // 4 for piece in TOKEN_PIECES.findall(text))
+
+TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+INTERRUPTED_MARKER = "[interrupted by the user]"
 
 class ContextManager:
-    def __init__(self, max_interactions=3, max_tokens=5000):
-        self.history = deque(maxlen=max_interactions)
+    def __init__(self, max_tokens=CONTEXT_MAX_TOKENS, mode=CONTEXT_MODE, count_tokens=approx_token_count, summarizer=None):
+        """
+        history is bounded by max_tokens (the system prompt isn't counted) rather than a number of turns.
+        count_tokens can be swapped for the model's real tokenizer, and summarizer(summary, turns) -> str
+        enables folding evicted turns into a rolling summary
+        """
+        self.history = deque()
         self.max_tokens = max_tokens
+        self.mode = mode # "chat" keeps a stable message prefix the server can reuse, "generate" builds one flat prompt
+        self.count_tokens = count_tokens
+        self.summarizer = summarizer
+        self.summary = ""
+        self.lock = threading.Lock()
         self.system_prompt = """You are Jarvis, a helpful voice assistant. 
 
 Give SHORT, CONVERSATIONAL responses when chatting, but provide enough detail when the user requests information, lists, or instructions.
@@ -35,24 +58,65 @@ Don't say this: I can suggest several recipes! (WRONG - too generic)
 
 Now respond naturally using any relevant context:"""
         
-    def add_interaction(self, user_prompt, assistant_response):
-        "add an interaction to history"
-        self.history.append({
-            "user": self.truncate_text(user_prompt),
-            "assistant": self.truncate_text(assistant_response)
-        })
-    
-    def truncate_text(self, text, max_len=100):
-        if len(text) > max_len:
-            return text[:max_len]
-        return text
-    
+    def add_interaction(self, user_prompt, assistant_response, interrupted=False):
+        """
+        add an interaction to history, evicting the oldest turns if it goes over the token budget
+        an interrupted response should only be the part the user heard, it's marked so the model knows it was cut off
+        """
+        if interrupted:
+            assistant_response = f"{assistant_response} {INTERRUPTED_MARKER}".strip()
+        interaction = {"user": user_prompt, "assistant": assistant_response}
+        interaction["tokens"] = self.count_tokens(user_prompt) + self.count_tokens(assistant_response)
+        with self.lock:
+            self.history.append(interaction)
+            evicted = self.evict()
+        if evicted and self.summarizer:
+            # summarizing costs an SLM call, do it off the response path
+            threading.Thread(target=self.fold_into_summary, args=(evicted,), daemon=True).start()
+
+    def history_tokens(self):
+        return sum(interaction["tokens"] for interaction in self.history) + self.count_tokens(self.summary)
+
+    def evict(self):
+        """
+        drop the oldest turns once history is over budget
+        it evicts down to CONTEXT_EVICT_TO of the budget in one go, so for the next few turns history only grows
+        at the end and the server's cached prefix stays valid
+        """
+        evicted = []
+        if self.history_tokens() <= self.max_tokens:
+            return evicted
+        target = self.max_tokens * CONTEXT_EVICT_TO
+        while self.history and self.history_tokens() > target:
+            evicted.append(self.history.popleft())
+        return evicted
+
+    def fold_into_summary(self, evicted):
+        """fold evicted turns into the rolling summary (runs in a background thread)"""
+        try:
+            summary = self.summarizer(self.summary, evicted)
+        except Exception as e:
+            print(f"Context summary error: {e}")
+            return
+        with self.lock:
+            self.summary = summary.strip()
+            # the summary has to fit the budget too
+            self.evict()
+
+    def snapshot(self):
+        """the summary and a copy of history, the summarizer thread can evict turns while a prompt is being built"""
+        with self.lock:
+            return self.summary, list(self.history)
+
     def build_prompt(self, current_input):
         "builds the prompt with conversation context"
+        summary, history = self.snapshot()
         prompt = [self.system_prompt]
-        if self.history:
+        if summary:
+            prompt.append(f"\nEarlier in this conversation: {summary}")
+        if history:
             prompt.append("\n=== CONVERSATION HISTORY (USE THIS!) ===")
-            for interaction in self.history:
+            for interaction in history:
                 prompt.append(f"User: {interaction['user']}")
                 prompt.append(f"Jarvis: {interaction['assistant']}")
             prompt.append("=== END HISTORY ===")
@@ -61,6 +125,24 @@ Now respond naturally using any relevant context:"""
         prompt.append(f"Jarvis:")  # Simpler, no brackets
         return "\n".join(prompt)
         
+    def build_messages(self, current_input):
+        """
+        builds chat messages with conversation context
+        the system prompt and earlier turns come first and never change, so the server's KV cache for them is
+        reused and only the newest turns get prefilled
+        """
+        summary, history = self.snapshot()
+        messages = [{"role": "system", "content": self.system_prompt}]
+        if summary:
+            messages.append({"role": "system", "content": f"Earlier in this conversation: {summary}"})
+        for interaction in history:
+            messages.append({"role": "user", "content": interaction["user"]})
+            messages.append({"role": "assistant", "content": interaction["assistant"]})
+        messages.append({"role": "user", "content": current_input})
+        return messages
+
     def clear(self):
         """clear conversation history"""
-        self.history.clear()    
+        with self.lock:
+            self.history.clear()
+            self.summary = ""    
@@ -44,6 +44,15 @@ class Functions:
         
         return False, ""
     
+    def matches(self, prompt):
+        """True if parse() would handle this prompt, without setting or cancelling anything"""
+        prompt = prompt.lower().strip()
+        if self.is_time_query(prompt) or self.parse_timer(prompt) or self.parse_alarm(prompt):
+            return True
+        if "timer" in prompt or "alarm" in prompt:
+            return any(word in prompt for word in ["left", "remaining", "status", "check", "cancel", "stop", "clear"])
+        return False
+    
     def is_time_query(self, prompt):
         """check if prompt is asking for current time."""
         time_patterns = [
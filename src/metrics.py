@@ -0,0 +1,120 @@
+import bisect
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from src.config import (
+    METRICS_JSONL_PATH, METRICS_JSONL_MAX_BYTES, METRICS_JSONL_BACKUPS, METRICS_PROM_PATH, METRICS_BUCKETS
+)
+
+# a turn's milestones in pipeline order, latencies are measured from the first one (the end of the user's speech)
+MILESTONES = ["speech_end", "record_end", "stt_done", "first_token", "first_segment", "first_synth", "first_audio"]
+
+class MetricsExporter:
+    """
+    per-turn latency export: every turn is appended to a size-rotated JSONL file, and histograms of
+    end of speech -> each milestone are rewritten to a Prometheus textfile (for node_exporter's textfile collector)
+    """
+    def __init__(self, jsonl_path=METRICS_JSONL_PATH, prom_path=METRICS_PROM_PATH, max_bytes=METRICS_JSONL_MAX_BYTES,
+                 backups=METRICS_JSONL_BACKUPS, buckets=METRICS_BUCKETS):
+        self.prom_path = prom_path
+        self.buckets = sorted(buckets)
+        self.host = socket.gethostname()
+        self.turns = {} # (source, interrupted) -> count
+        self.latency = {m: {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0} for m in MILESTONES[1:]}
+        self.last = {} # milestone -> seconds, for the most recent turn
+        self.last_time = 0.0
+        self.lock = threading.Lock()
+        self.log = None
+        if jsonl_path:
+            make_dirs(jsonl_path)
+            # a logger of its own so the rotation is handled by RotatingFileHandler
+            self.log = logging.getLogger(f"jarvis.metrics.{os.path.abspath(jsonl_path)}")
+            if not self.log.handlers:
+                handler = RotatingFileHandler(jsonl_path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                self.log.addHandler(handler)
+            self.log.setLevel(logging.INFO)
+            self.log.propagate = False
+        if prom_path:
+            make_dirs(prom_path)
+
+    def export(self, marks, source=None, interrupted=False):
+        """record one turn from its perf_counter() milestones, turns without any speech are skipped"""
+        if "speech_end" not in marks:
+            return
+        latencies = {m: marks[m] - marks["speech_end"] for m in MILESTONES[1:] if m in marks}
+        record = {"time": round(time.time(), 3), "host": self.host, "source": source, "interrupted": interrupted}
+        record.update({f"{m}_ms": round(seconds * 1000) for m, seconds in latencies.items()})
+        with self.lock:
+            key = (source or "none", interrupted)
+            self.turns[key] = self.turns.get(key, 0) + 1
+            for m, seconds in latencies.items():
+                stats = self.latency[m]
+                i = bisect.bisect_left(self.buckets, seconds)
+                if i < len(self.buckets):
+                    stats["buckets"][i] += 1
+                stats["sum"] += seconds
+                stats["count"] += 1
+            self.last = latencies
+            self.last_time = record["time"]
+            text = self.prometheus()
+        try:
+            if self.log:
+                self.log.info(json.dumps(record))
+            if self.prom_path:
+                write_atomic(self.prom_path, text)
+        except OSError as e:
+            print(f"Metrics export error: {e}")
+        if "first_audio" in latencies:
+            print(f"End of speech to first audio: {latencies['first_audio'] * 1000:.0f}ms")
+
+    def prometheus(self):
+        """everything so far in the Prometheus text exposition format"""
+        lines = [
+            "# HELP jarvis_turns_total Conversation turns answered, by where the response came from.",
+            "# TYPE jarvis_turns_total counter"
+        ]
+        for (source, interrupted), count in sorted(self.turns.items()):
+            lines.append(f'jarvis_turns_total{{source="{source}",interrupted="{str(interrupted).lower()}"}} {count}')
+        lines += [
+            "# HELP jarvis_turn_latency_seconds Time from the end of the user's speech to each milestone of the response.",
+            "# TYPE jarvis_turn_latency_seconds histogram"
+        ]
+        for m, stats in self.latency.items():
+            if not stats["count"]:
+                continue
+            cumulative = 0
+            for le, count in zip(self.buckets, stats["buckets"]):
+                cumulative += count
+                lines.append(f'jarvis_turn_latency_seconds_bucket{{milestone="{m}",le="{le}"}} {cumulative}')
+            lines.append(f'jarvis_turn_latency_seconds_bucket{{milestone="{m}",le="+Inf"}} {stats["count"]}')
+            lines.append(f'jarvis_turn_latency_seconds_sum{{milestone="{m}"}} {stats["sum"]:.6f}')
+            lines.append(f'jarvis_turn_latency_seconds_count{{milestone="{m}"}} {stats["count"]}')
+        lines += [
+            "# HELP jarvis_last_turn_latency_seconds The most recent turn's time from the end of speech to each milestone.",
+            "# TYPE jarvis_last_turn_latency_seconds gauge"
+        ]
+        for m, seconds in self.last.items():
+            lines.append(f'jarvis_last_turn_latency_seconds{{milestone="{m}"}} {seconds:.6f}')
+        lines += [
+            "# HELP jarvis_last_turn_timestamp_seconds Unix time of the most recent turn.",
+            "# TYPE jarvis_last_turn_timestamp_seconds gauge",
+            f"jarvis_last_turn_timestamp_seconds {self.last_time}"
+        ]
+        return "\n".join(lines) + "\n"
+
+def make_dirs(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+def write_atomic(path, text):
+    """write to a temp file and rename it over path, so a scraper never reads a half-written file"""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
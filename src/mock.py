@@ -0,0 +1,211 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from src.playback import OutputEngine
+from src.context import approx_token_count
+from src.config import (
+    OLLAMA_MODEL, SLM_NUM_PREDICT, OUTPUT_FRAMES_PER_BUFFER, TTS_RATE,
+    MOCK_OLLAMA_PORT, MOCK_TTFT, MOCK_TOKEN_RATE, MOCK_TTS_RTF, MOCK_SAMPLE_RATE
+)
+
+RESPONSES = [
+    "Sure! Here's one: why don't scientists trust atoms? Because they make up everything.",
+    "It's currently sunny with a high of 72 degrees, and there's a light breeze, e.g. about 5 mph from the west.",
+    "Hello! How can I help you today?",
+    "A classic chocolate chip cookie recipe needs butter, sugar, eggs, flour and chocolate chips. "
+    "Cream the butter and sugar, mix in the eggs, fold in the flour and chips, then bake at 350 degrees for about 10 minutes."
+]
+
+class MockOllamaServer:
+    """
+    a local stand-in for the Ollama server: streams canned responses over /api/generate and /api/chat
+    in Ollama's NDJSON format, with a fixed time to first token and token rate
+    """
+    def __init__(self, port=MOCK_OLLAMA_PORT, ttft=MOCK_TTFT, token_rate=MOCK_TOKEN_RATE, responses=RESPONSES, host="127.0.0.1"):
+        self.host = host
+        self.ttft = ttft
+        self.token_rate = token_rate
+        self.responses = responses
+        self.requests = 0
+        self.disconnects = 0 # streams the client hung up on (eg a cancelled generation)
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self.handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.server.server_port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handler(self):
+        mock = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # keep-alive, like the real server
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path not in ("/api/generate", "/api/chat"):
+                    self.send_error(404)
+                    return
+                mock.respond(self, self.path == "/api/chat", request)
+
+            def log_message(self, *args):
+                pass
+        return Handler
+
+    def tokens(self, num_predict):
+        """the next canned response, cut into word-piece tokens like a real tokenizer would"""
+        with self.lock:
+            self.requests += 1
+            text = self.responses[(self.requests - 1) % len(self.responses)]
+        return re.findall(r" ?[^\s]{1,4}", text)[:num_predict]
+
+    def respond(self, handler, chat, request):
+        messages = request.get("messages", [])
+        prompt = " ".join(m.get("content", "") for m in messages) if chat else request.get("prompt", "")
+        tokens = self.tokens(request.get("options", {}).get("num_predict", SLM_NUM_PREDICT))
+        model = request.get("model", OLLAMA_MODEL)
+
+        def chunk(token):
+            if chat:
+                return {"model": model, "message": {"role": "assistant", "content": token}, "done": False}
+            return {"model": model, "response": token, "done": False}
+
+        done = {
+            "model": model,
+            "done": True,
+            "prompt_eval_count": approx_token_count(prompt),
+            "prompt_eval_duration": int(self.ttft * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": int(len(tokens) / self.token_rate * 1e9)
+        }
+        time.sleep(self.ttft)
+        if not request.get("stream", True):
+            time.sleep(max(0, len(tokens) - 1) / self.token_rate)
+            text = "".join(tokens)
+            done.update({"message": {"role": "assistant", "content": text}} if chat else {"response": text})
+            body = json.dumps(done).encode()
+            handler.send_response(200)
+            handler.send_header("Content-Type", "application/json")
+            handler.send_header("Content-Length", str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/x-ndjson")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+        try:
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(1 / self.token_rate)
+                write_chunk(handler.wfile, chunk(token))
+            write_chunk(handler.wfile, done)
+            handler.wfile.write(b"0\r\n\r\n")
+            handler.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            with self.lock:
+                self.disconnects += 1
+            handler.close_connection = True
+
+def write_chunk(wfile, message):
+    """one NDJSON line as an HTTP chunk"""
+    data = json.dumps(message).encode() + b"\n"
+    wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+    wfile.flush()
+
+class FakeVoice:
+    """
+    stands in for PiperVoice: yields a quiet tone per clause, as long as the clause would take to say at
+    words_per_minute, after spending real_time_factor times that long "synthesizing" it
+    """
+    def __init__(self, real_time_factor=MOCK_TTS_RTF, sample_rate=MOCK_SAMPLE_RATE, words_per_minute=TTS_RATE):
+        self.real_time_factor = real_time_factor
+        self.sample_rate = sample_rate
+        self.words_per_minute = words_per_minute
+
+    def synthesize(self, text):
+        chunks = list(self.synthesize_stream(text))
+        if not chunks:
+            return np.zeros(0, dtype=np.int16)
+        return np.concatenate(chunks)
+
+    def synthesize_stream(self, text):
+        for clause in re.split(r"(?<=[,;:.!?])\s+", text.strip()):
+            words = len(clause.split())
+            if not words:
+                continue
+            seconds = words * 60 / self.words_per_minute
+            time.sleep(seconds * self.real_time_factor)
+            t = np.arange(int(seconds * self.sample_rate)) / self.sample_rate
+            yield (np.sin(2 * np.pi * 220 * t) * 1000).astype(np.int16)
+
+class FakeOutput(OutputEngine):
+    """
+    OutputEngine without a sound card: a thread runs the audio callback at real-time pace,
+    and everything played is kept in recording if one is given
+    """
+    def __init__(self, sample_rate=MOCK_SAMPLE_RATE, frames_per_buffer=OUTPUT_FRAMES_PER_BUFFER, recording=None):
+        self.recording = recording
+        self.running = True
+        super().__init__(sample_rate, frames_per_buffer)
+
+    def open(self, frames_per_buffer):
+        self.thread = threading.Thread(target=self.run, args=(frames_per_buffer,), daemon=True)
+        self.thread.start()
+
+    def run(self, frames_per_buffer):
+        period = frames_per_buffer / self.device_rate
+        next_time = time.perf_counter()
+        while self.running:
+            playing = self.busy()
+            out, _ = self.callback(None, frames_per_buffer, None, None)
+            if playing and self.recording is not None:
+                self.recording.append(np.frombuffer(out, dtype=np.int16))
+            next_time += period
+            time.sleep(max(0, next_time - time.perf_counter()))
+
+    def output_latency(self):
+        return 0.0
+
+    def shutdown(self):
+        self.stop()
+        self.running = False
+        self.thread.join(timeout=1)
+
+# benchmark the response pipeline offline
+if __name__ == "__main__":
+    from src.models import Models
+    from src.turn import ResponseTurn
+    server = MockOllamaServer().start()
+    models = Models(ollama_url=server.url, voice=FakeVoice(), output=FakeOutput())
+    print(f"Mock Ollama at {server.url}, TTFT {MOCK_TTFT * 1000:.0f}ms, {MOCK_TOKEN_RATE} tokens/s, TTS RTF {MOCK_TTS_RTF}")
+    models.warmup_slm()
+    for prompt in ["Tell me a joke", "What's the weather like", "Hi", "I want a cookie recipe"]:
+        first_audio = []
+        models.on_playback_start = lambda pcm, delay: first_audio.append(time.perf_counter() + delay)
+        played = threading.Event()
+        def watch(stop):
+            # no microphone, so never an interrupt
+            played.wait()
+            return False
+        start = time.perf_counter()
+        print(f"\nYou: {prompt}\nAssistant: ", end="")
+        ResponseTurn(models, models.chat_stream([{"role": "user", "content": prompt}]), watch, played.set).run()
+        total = (time.perf_counter() - start) * 1000
+        print(f"first audio {(first_audio[0] - start) * 1000:.0f}ms, turn {total:.0f}ms")
+    models.shutdown()
+    server.stop()
@@ -1,37 +1,89 @@
-from faster_whisper import WhisperModel
-import os
 import subprocess
-import requests
-import json
 import numpy as np
 from src.timing import timer
-from src.config import WHISPER_MODEL, OLLAMA_MODEL
+from src.stt import StreamingTranscriber
+from src.tts import PiperVoice, voice_sample_rate
+from src.playback import OutputEngine
+from src.ollama import OllamaClient
+from src.config import SAMPLE_RATE, OLLAMA_URL, WHISPER_MODEL, WHISPER_CPU_THREADS, PIPER_VOICE_PATH, CONTEXT_SUMMARY_TOKENS, TTS_PREFETCH_SENTENCES, TTS_CLI_CHUNK_SECONDS
 import threading
-os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
-import pygame
+import queue
+
+FALLBACK_RESPONSE = "Sorry, I had trouble processing that."
 
 class Models:
-    def __init__(self):
+    def __init__(self, ollama_url=OLLAMA_URL, voice=None, output=None):
+        """
+        voice and output can be swapped for stand-ins (see src/mock.py) and ollama_url pointed at a mock server,
+        to run the response pipeline without the real models or audio hardware
+        """
         self.whisper = None
-        self.ollama_url = "http://localhost:11434/api/generate" 
-        self.speak_lock = threading.Lock()
-        pygame.mixer.init(frequency=16000, size=-16, channels=1, buffer=512)
+        self.whisper_model = WHISPER_MODEL
+        self.whisper_threads = WHISPER_CPU_THREADS
+        self.voice = voice
+        self.llm = OllamaClient(ollama_url)
+        # hooks so the echo canceller knows exactly what is being played
+        self.on_playback_start = None # called with the int16 PCM and the seconds until it starts playing
+        self.on_playback_stop = None # called when playback is cut off
+        # the output stream is opened once, at the voice's native rate
+        self.sample_rate = voice.sample_rate if voice else voice_sample_rate()
+        self.output = output or OutputEngine(self.sample_rate)
+        self.speech = SpeechQueue(self.synthesize_stream, self.start_playback, self.stop_playback)
         
     def load(self):
-        """load models into memory (just faster-whisper now)"""
-        with timer.section("model_load"):
-            self.whisper = WhisperModel(
-                WHISPER_MODEL, 
-                device="cpu",  
-                compute_type="int8",
-                cpu_threads=2  
-            )
+        """load models into memory (faster-whisper and the Piper voice), Jarvis.initialize runs these in parallel instead"""
+        self.load_stt()
+        self.load_voice()
+
+    def load_stt(self):
+        """load Whisper and decode a second of silence, the first real transcription would otherwise pay for its setup"""
+        with timer.section("whisper_load"):
+            self.whisper = self.load_whisper()
+            segments, _ = self.whisper.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32), beam_size=1)
+            list(segments) # the decode only runs as the segments are read
+
+    def load_voice(self):
+        """load the Piper voice and synthesize a word, so the first sentence doesn't pay for onnxruntime's first run"""
+        with timer.section("voice_load"):
+            if self.voice is None:
+                try:
+                    self.voice = PiperVoice()
+                except Exception as e:
+                    print(f"In-process Piper unavailable ({e}), falling back to the piper CLI")
+                    return
+            try:
+                self.voice.synthesize("Hi")
+            except Exception as e:
+                print(f"TTS warmup failed: {e}")
     
+    def load_whisper(self):
+        # faster_whisper pulls in ctranslate2 and friends, too slow an import to pay before startup can go parallel
+        from faster_whisper import WhisperModel
+        return WhisperModel(
+            self.whisper_model, 
+            device="cpu",  
+            compute_type="int8",
+            cpu_threads=self.whisper_threads  
+        )
+
+    def set_quality(self, whisper_model, whisper_threads, num_predict):
+        """
+        swap the speed/quality settings (see QUALITY_LEVELS), Whisper is only reloaded if its settings changed
+        the new model is loaded before it replaces the old one, so a transcription already running finishes on the old one
+        """
+        self.llm.num_predict = num_predict
+        if (whisper_model, whisper_threads) == (self.whisper_model, self.whisper_threads):
+            return
+        self.whisper_model, self.whisper_threads = whisper_model, whisper_threads
+        if self.whisper is not None:
+            with timer.section("whisper_reload"):
+                self.whisper = self.load_whisper()
+
     @timer.measure("STT")
     def transcribe(self, audio_data):
         """use whisper for STT"""
         if self.whisper is None:
-            self.load()
+            self.load_stt()
         segments, info = self.whisper.transcribe(
             audio_data, 
             beam_size=1,           
@@ -45,94 +97,265 @@ class Models:
             
         return text.strip()
     
+    def streaming_transcriber(self, on_partial=None):
+        """returns a StreamingTranscriber to feed audio to while recording"""
+        if self.whisper is None:
+            self.load_stt()
+        return StreamingTranscriber(self.whisper, on_partial=on_partial)
+
     @timer.measure("slm")  
     def generate(self, prompt):
         """generate full SLM response (no streaming)"""
         try:
-            data = {
-                "model": OLLAMA_MODEL,
-                "prompt": prompt,
-                "stream": False, 
-                "options": {
-                    "num_predict": 100,
-                    "temperature": 0.7
-                }
-            }
-            response = requests.post(self.ollama_url, json=data, timeout=30)
-            response.raise_for_status()
-            return response.json()["response"]
+            return self.llm.generate(prompt)
         except Exception as e:
             print(f"LLM generation error: {e}")
-            return "Sorry, I had trouble processing that."
+            return FALLBACK_RESPONSE
 
-    def generate_stream(self, prompt):
-        """stream tokens as SLM generates"""
+    def generate_stream(self, prompt, handle=None):
+        """stream tokens as SLM generates, handle (an ollama.StreamHandle) can cancel just this stream"""
         try:
-            data = {
-                "model": OLLAMA_MODEL,
-                "prompt": prompt,
-                "stream": True,
-                "options": {
-                    "num_predict": 100,
-                    "temperature": 0.7
-                }
-            }
-            with requests.post(self.ollama_url, json=data, stream=True, timeout=30) as response:
-                response.raise_for_status()
-                for line in response.iter_lines():
-                    if line:
-                        try:
-                            chunk = json.loads(line)
-                            if 'response' in chunk and not chunk.get('done'):
-                                yield chunk['response']
-                        except json.JSONDecodeError:
-                            continue    
+            yield from self.llm.generate_stream(prompt, handle=handle)
         except Exception as e:
             print(f"Streaming generation error: {e}")
-            yield "Sorry, I had trouble processing that."
+            yield FALLBACK_RESPONSE
+
+    def summarize(self, summary, interactions):
+        """fold conversation turns into a short rolling summary (used by ContextManager)"""
+        turns = "\n".join(f"User: {i['user']}\nJarvis: {i['assistant']}" for i in interactions)
+        prompt = (
+            "Update the summary of a conversation between a user and Jarvis, a voice assistant. "
+            "Keep names, facts, preferences and open requests. Reply with the summary only, in two sentences at most.\n"
+            f"Current summary: {summary or 'none'}\n"
+            f"New turns:\n{turns}\n"
+            "Updated summary:"
+        )
+        return self.llm.generate(prompt, num_predict=CONTEXT_SUMMARY_TOKENS, temperature=0.2)
+
+    def chat_stream(self, messages, handle=None):
+        """stream tokens for a list of chat messages (lets the server reuse the cached prefix)"""
+        try:
+            yield from self.llm.chat_stream(messages, handle=handle)
+        except Exception as e:
+            print(f"Streaming generation error: {e}")
+            yield FALLBACK_RESPONSE
+
+    def cancel_generation(self):
+        """abort any SLM generation in flight (used on barge-in) so the server stops generating"""
+        if self.llm.cancel():
+            print("Cancelled SLM generation")
+
+    def warmup_slm(self, messages=None):
+        """load the SLM on the server and pin it there, so the first turn doesn't pay a cold start"""
+        try:
+            ttft = self.llm.warmup(messages)
+            print(f"SLM warm, time to first token {ttft:.0f}ms")
+        except Exception as e:
+            print(f"SLM warmup failed: {e}")
+
+    def synthesize(self, text):
+        """text -> int16 PCM, in-process if the voice is loaded"""
+        chunks = list(self.synthesize_stream(text))
+        if not chunks:
+            return np.zeros(0, dtype=np.int16)
+        return np.concatenate(chunks)
+
+    def synthesize_stream(self, text):
+        """text -> int16 PCM chunks, yielded as soon as each is ready so playback can start early"""
+        if self.voice:
+            yield from self.voice.synthesize_stream(text)
+            return
+        process = subprocess.Popen(
+            ['piper', '--model', PIPER_VOICE_PATH, '--output-raw'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        process.stdin.write(text.encode())
+        process.stdin.close()
+        # piper writes raw audio sentence by sentence, read it in small pieces instead of waiting for all of it
+        chunk_bytes = int(TTS_CLI_CHUNK_SECONDS * self.sample_rate) * 2
+        try:
+            while True:
+                audio_data = process.stdout.read(chunk_bytes)
+                if not audio_data:
+                    break
+                yield np.frombuffer(audio_data[:len(audio_data) // 2 * 2], dtype=np.int16)
+        finally:
+            process.stdout.close()
+            process.wait()
+
+    def start_playback(self, audio_array, on_done=None):
+        """queue int16 PCM on the output right behind whatever is playing, on_done(played) is called once it's finished"""
+        delay = self.output.write(audio_array, on_done)
+        if self.on_playback_start:
+            self.on_playback_start(audio_array, delay)
 
-    @timer.measure("TTS")
     def speak(self, text, wait=True):
-        """use Piper for TTS"""
+        """use Piper for TTS, queues the text behind anything that is already being spoken"""
         if not text:
             return
-        with self.speak_lock:
-            try:
-                pygame.mixer.music.stop()
-                process = subprocess.Popen(
-                    ['piper', '--model', 'voices/en_US-amy-low.onnx', '--output-raw'],
-                    stdin=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.DEVNULL
-                )
-                audio_data, _ = process.communicate(input=text.encode())
-                
-                # Convert raw audio to pygame format
-                audio_array = np.frombuffer(audio_data, dtype=np.int16)
-                sound = pygame.sndarray.make_sound(audio_array)
-                
-                channel = sound.play()
-                
-                if wait and channel:
-                    while channel.get_busy():
-                        pygame.time.wait(10)     
-            except Exception as e:
-                print(f"TTS error: {e}")
+        self.speech.put(text)
+        if wait:
+            self.speech.wait()
+
+    def play(self, chunks):
+        """queue already synthesized PCM chunks (eg a cached response) behind anything being spoken"""
+        for audio_array in chunks:
+            self.speech.put(audio_array)
+
+    def wait_until_done_speaking(self, timeout=None):
+        """block until everything queued has been played (or flushed)"""
+        return self.speech.wait(timeout)
     
     def stop_speaking(self):
-        """stops speech immediately"""
-        with self.speak_lock:
-            pygame.mixer.stop()
+        """stops speech immediately, dropping anything queued for synthesis or playback"""
+        self.speech.flush()
+
+    def stop_playback(self):
+        """cut the output off at the next audio callback, returns the dropped chunks' on_done callbacks"""
+        dropped = self.output.stop()
+        if self.on_playback_stop:
+            self.on_playback_stop()
+        return dropped
     
     def is_speaking(self):
-        """checks if currently speaking"""
-        return pygame.mixer.get_busy()
+        """checks if currently speaking (or has speech queued)"""
+        return self.speech.busy()
+
+    def shutdown(self):
+        self.speech.shutdown()
+        self.output.shutdown()
+        self.llm.close()
+
+class SpeechQueue:
+    """
+    two stage TTS worker: the synthesis thread turns queued sentences into PCM chunks while the playback
+    thread hands the previous ones to the output, so sentence N+1 is usually ready the moment sentence N ends.
+    chunks go to the output as soon as they're synthesized, so long sentences start speaking early.
+    the output reports finished chunks through item_done, flush() drops everything in both stages (used for interrupts)
+    already synthesized PCM can be put() too, it skips synthesis but keeps its place in line.
+    this speaks whatever isn't an SLM response: function results, announcements and cached replays. SLM responses go
+    through turn.ResponseTurn, which has to cancel the token stream along with the speech on a barge-in. both keep at most
+    TTS_PREFETCH_SENTENCES synthesized chunks waiting, but here each one goes to the output FIFO as soon as it's ready,
+    where the turn keeps only TURN_OUTPUT_CHUNKS_AHEAD on it
+    """
+    def __init__(self, synthesize_stream, start_playback, stop_playback, prefetch=TTS_PREFETCH_SENTENCES):
+        self.synthesize_stream = synthesize_stream
+        self.start_playback = start_playback
+        self.stop_playback = stop_playback
+        self.text_queue = queue.Queue()
+        self.audio_queue = queue.Queue(maxsize=prefetch) # bounded so synthesis doesn't run far ahead
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+        self.generation = 0 # bumped on flush, items from an older generation are dropped
+        self.pending = 0 # sentences/chunks queued but not yet played or dropped
+        self.running = True
+        self.synthesis_thread = threading.Thread(target=self.synthesis_loop, daemon=True)
+        self.playback_thread = threading.Thread(target=self.playback_loop, daemon=True)
+        self.synthesis_thread.start()
+        self.playback_thread.start()
+
+    def put(self, text):
+        with self.lock:
+            self.pending += 1
+            generation = self.generation
+        self.text_queue.put((generation, text))
+
+    def add_pending(self):
+        with self.lock:
+            self.pending += 1
+
+    def item_done(self, count=1):
+        with self.lock:
+            self.pending -= count
+            if self.pending == 0:
+                self.idle.notify_all()
+
+    def synthesis_loop(self):
+        """stage 1: text -> PCM chunks"""
+        while self.running:
+            item = self.text_queue.get()
+            if item is None:
+                break
+            generation, text = item
+            if isinstance(text, np.ndarray):
+                self.audio_queue.put((generation, text))
+                continue
+            chunks = 0
+            try:
+                with timer.section("TTS"):
+                    for audio_array in self.synthesize_stream(text):
+                        if generation != self.generation:
+                            break
+                        # the sentence was counted once in put(), every extra chunk is counted here
+                        if chunks:
+                            self.add_pending()
+                        self.audio_queue.put((generation, audio_array))
+                        chunks += 1
+            except Exception as e:
+                print(f"TTS error: {e}")
+            if not chunks:
+                self.item_done()
+
+    def playback_loop(self):
+        """stage 2: PCM chunks -> output FIFO (the output calls item_done once each chunk has played)"""
+        while self.running:
+            item = self.audio_queue.get()
+            if item is None:
+                break
+            generation, audio_array = item
+            try:
+                # checked under the lock so a flush can't slip in between the check and queueing the audio
+                with self.lock:
+                    stale = generation != self.generation or not len(audio_array)
+                    if not stale:
+                        self.start_playback(audio_array, lambda played: self.item_done())
+            except Exception as e:
+                print(f"Playback error: {e}")
+                stale = True
+            if stale:
+                self.item_done()
+
+    def flush(self):
+        """drop everything queued in both stages and stop playback"""
+        with self.lock:
+            self.generation += 1
+            dropped = self.stop_playback()
+        # dropped chunks may belong to other writers too, each one is told through its own callback
+        for on_done in dropped:
+            on_done(False)
+        for q in (self.text_queue, self.audio_queue):
+            while True:
+                try:
+                    item = q.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    self.item_done()
+
+    def wait(self, timeout=None):
+        """block until everything queued has played, returns False on timeout"""
+        with self.idle:
+            return self.idle.wait_for(lambda: self.pending == 0, timeout)
+
+    def busy(self):
+        return self.pending > 0
+
+    def shutdown(self):
+        self.flush()
+        self.running = False
+        self.text_queue.put(None)
+        self.audio_queue.put(None)
 
 # testing
 if __name__ == "__main__":
     models = Models()
     models.load()
     models.speak("Hello, testing Piper Text-to-Speech")
+    models.speak("This sentence was synthesized while the first one played.", wait=False)
+    models.speak("And so was this one.")
     response = models.generate("Say 'Hello, this is Piper Text-to-Speech' and nothing else")
     print(f"SLM said: {response}")
-    timer.report()
\ No newline at end of file
+    timer.report()
+    models.shutdown()
\ No newline at end of file
@@ -0,0 +1,190 @@
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from src.timing import timer
+from src.config import (
+    MONITOR_INTERVAL, MONITOR_TEMP_HOT, MONITOR_TEMP_COOL, MONITOR_LATENCY_TARGET, MONITOR_LATENCY_TURNS,
+    MONITOR_STEP_DOWN_WAIT, MONITOR_STEP_UP_WAIT, QUALITY_LEVELS
+)
+
+THERMAL_ZONE = "/sys/class/thermal/thermal_zone0/temp" # the SoC on the Pi, in millidegrees
+CPU_FREQ = "/sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq" # kHz
+CPU_MAX_FREQ = "/sys/devices/system/cpu/cpu0/cpufreq/cpuinfo_max_freq"
+THROTTLED = "/sys/devices/platform/soc/soc:firmware/get_throttled" # firmware flags, bit 2 = throttling now (not on every kernel)
+
+def read_number(path):
+    """a number from a sysfs/procfs file, None where it doesn't exist (eg off the Pi)"""
+    try:
+        with open(path) as f:
+            return int(f.read().split()[0], 0)
+    except (OSError, ValueError, IndexError):
+        return None
+
+def read_rss():
+    """resident memory of this process in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, IndexError):
+        return None
+
+def sample_resources():
+    """one reading of everything the policy looks at, missing sensors are None"""
+    temp = read_number(THERMAL_ZONE)
+    freq = read_number(CPU_FREQ)
+    max_freq = read_number(CPU_MAX_FREQ)
+    throttled = read_number(THROTTLED)
+    try:
+        load = os.getloadavg()[0]
+    except OSError:
+        load = None
+    return {
+        "temp": temp / 1000 if temp is not None else None,
+        "freq": freq / 1000 if freq is not None else None, # MHz
+        "freq_ratio": freq / max_freq if freq and max_freq else None,
+        "throttled": bool(throttled & 0x4) if throttled is not None else None,
+        "load": load,
+        "rss": read_rss()
+    }
+
+def describe(sample):
+    parts = []
+    if sample["temp"] is not None:
+        parts.append(f"{sample['temp']:.1f}C")
+    if sample["freq"] is not None:
+        parts.append(f"{sample['freq']:.0f}MHz")
+    if sample["throttled"]:
+        parts.append("throttled")
+    if sample["load"] is not None:
+        parts.append(f"load {sample['load']:.2f}")
+    if sample["rss"] is not None:
+        parts.append(f"rss {sample['rss']:.0f}MB")
+    return ", ".join(parts) or "no sensors"
+
+class QualityPolicy:
+    """
+    picks a level from QUALITY_LEVELS: one step cheaper while the SoC is hot, throttled or turns miss the latency target,
+    one step back once it's cool and fast again for a while. the CPU clock isn't used on its own,
+    the governor drops it whenever we're idle
+    """
+    def __init__(self, levels=QUALITY_LEVELS, temp_hot=MONITOR_TEMP_HOT, temp_cool=MONITOR_TEMP_COOL,
+                 latency_target=MONITOR_LATENCY_TARGET, latency_turns=MONITOR_LATENCY_TURNS,
+                 step_down_wait=MONITOR_STEP_DOWN_WAIT, step_up_wait=MONITOR_STEP_UP_WAIT):
+        self.levels = levels
+        self.temp_hot = temp_hot
+        self.temp_cool = temp_cool
+        self.latency_target = latency_target
+        self.step_down_wait = step_down_wait
+        self.step_up_wait = step_up_wait
+        self.level = 0
+        self.changed_at = time.monotonic()
+        self.headroom_since = None # when it last became cool and fast, None while it isn't
+        self.latencies = deque(maxlen=latency_turns) # seconds from end of speech to first audio, since the last change
+        self.lock = threading.Lock()
+
+    def add_latency(self, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+
+    def decide(self, sample, now=None):
+        """the level to run at given the latest sample, returns (level, reason), reason is None if it's unchanged"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            latency = statistics.median(self.latencies) if len(self.latencies) == self.latencies.maxlen else None
+        temp = sample["temp"]
+        pressure = []
+        if temp is not None and temp >= self.temp_hot:
+            pressure.append(f"{temp:.1f}C >= {self.temp_hot:.0f}C")
+        if sample["throttled"]:
+            pressure.append("CPU throttled")
+        if latency is not None and latency > self.latency_target:
+            pressure.append(f"median first audio {latency:.2f}s > {self.latency_target:.2f}s")
+        if pressure and self.level < len(self.levels) - 1 and now - self.changed_at >= self.step_down_wait:
+            return self.change(self.level + 1, now, "; ".join(pressure))
+        cool = temp is None or temp < self.temp_cool
+        fast = latency is None or latency < self.latency_target * 0.75
+        if pressure or not cool or not fast:
+            self.headroom_since = None
+            return self.level, None
+        if self.headroom_since is None:
+            self.headroom_since = now
+        # only after step_up_wait of continuous headroom, one cool sample after a hot spell isn't enough
+        recovered = now - self.headroom_since
+        if self.level > 0 and recovered >= self.step_up_wait:
+            result = self.change(self.level - 1, now, f"cool and fast for {recovered:.0f}s")
+            self.headroom_since = now # the next step up needs another full step_up_wait
+            return result
+        return self.level, None
+
+    def change(self, level, now, reason):
+        self.level = level
+        self.changed_at = now
+        self.headroom_since = None
+        with self.lock:
+            # latencies measured at the old level say nothing about the new one
+            self.latencies.clear()
+        return level, reason
+
+class ResourceMonitor:
+    """
+    background thread sampling temperature, CPU clock, load and RSS every interval,
+    on_change(settings) is called (on this thread) with the new QUALITY_LEVELS entry whenever the policy picks another level.
+    every decision goes through timer.event so it shows up with the turn it happened in
+    """
+    def __init__(self, on_change, policy=None, interval=MONITOR_INTERVAL):
+        self.on_change = on_change
+        self.policy = policy or QualityPolicy()
+        self.interval = interval
+        self.latest = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def settings(self):
+        return self.policy.levels[self.policy.level]
+
+    def start(self):
+        self.latest = sample_resources()
+        print(f"Resource monitor: {describe(self.latest)}")
+        self.thread = threading.Thread(target=self.run, name="resource_monitor", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Resource monitor error: {e}")
+
+    def check(self):
+        self.latest = sample_resources()
+        old = self.policy.level
+        level, reason = self.policy.decide(self.latest)
+        if reason is None:
+            return
+        timer.event("quality", f"level {old} -> {level}: {reason} ({describe(self.latest)})")
+        self.on_change(self.settings)
+
+    def add_turn(self, marks):
+        """feed a finished turn's end of speech -> first audio latency to the policy"""
+        if "speech_end" in marks and "first_audio" in marks:
+            self.policy.add_latency(marks["first_audio"] - marks["speech_end"])
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=1)
+
+# testing
+if __name__ == "__main__":
+    print(describe(sample_resources()))
+    policy = QualityPolicy(step_down_wait=10, step_up_wait=60)
+    hot = {"temp": 80.0, "freq": 1500.0, "freq_ratio": 0.6, "throttled": False, "load": 3.5, "rss": 900.0}
+    cool = dict(hot, temp=60.0)
+    # (seconds, sample): two steps down, a cool blip that doesn't count, then a minute of headroom per step up
+    timeline = [(10, hot), (20, hot), (100, hot), (102, cool), (110, hot), (120, cool), (170, cool), (181, cool), (200, cool), (242, cool)]
+    start = policy.changed_at
+    for t, sample in timeline:
+        print(t, sample["temp"], policy.decide(sample, now=start + t))
@@ -0,0 +1,204 @@
+import json
+import time
+import socket
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from src.timing import timer
+from src.config import (
+    OLLAMA_URL, OLLAMA_MODEL, OLLAMA_KEEP_ALIVE, OLLAMA_POOL_SIZE, OLLAMA_TIMEOUT,
+    SLM_NUM_PREDICT, SLM_TEMPERATURE
+)
+
+class OllamaClient:
+    """
+    persistent client for the Ollama server
+    every request goes over one pooled keep-alive session instead of a fresh TCP connection,
+    and keep_alive pins the model in memory so sparse wake-word turns don't pay a cold load
+    """
+    def __init__(self, base_url=OLLAMA_URL, model=OLLAMA_MODEL, keep_alive=OLLAMA_KEEP_ALIVE):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.keep_alive = keep_alive
+        self.num_predict = SLM_NUM_PREDICT # max tokens per response, lowered by the resource monitor when the Pi is hot
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=OLLAMA_POOL_SIZE)
+        # connections that tell the stream sending on them which socket it's on, so it can be cancelled before any reply
+        adapter.poolmanager.pool_classes_by_scheme = {"http": TrackedConnectionPool, "https": HTTPSConnectionPool}
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.last_ttft = None # ms from sending the request to the first token, for the last streamed generation
+        self.last_prefill = None # (prompt tokens evaluated, ms) for the last streamed generation
+        self.active = set() # StreamHandles of the streams in flight, so cancel() can abort them from another thread
+        self.lock = threading.Lock()
+
+    def options(self, **overrides):
+        options = {"num_predict": self.num_predict, "temperature": SLM_TEMPERATURE}
+        options.update(overrides)
+        return options
+
+    def payload(self, prompt, stream, **options):
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": self.options(**options)
+        }
+
+    def generate(self, prompt, **options):
+        """full (non-streamed) response text"""
+        response = self.session.post(f"{self.base_url}/api/generate", json=self.payload(prompt, False, **options), timeout=OLLAMA_TIMEOUT)
+        response.raise_for_status()
+        return response.json()["response"]
+
+    def generate_stream(self, prompt, handle=None, **options):
+        """yield tokens as they're generated from a flat prompt string"""
+        yield from self.stream("/api/generate", self.payload(prompt, True, **options), lambda chunk: chunk.get('response'), handle)
+
+    def chat_stream(self, messages, handle=None, **options):
+        """
+        yield tokens for a chat conversation
+        the server keeps the KV cache of the previous request, so when the messages only grow by the newest turns
+        just those tokens are prefilled
+        """
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "stream": True,
+            "keep_alive": self.keep_alive,
+            "options": self.options(**options)
+        }
+        yield from self.stream("/api/chat", payload, lambda chunk: chunk.get('message', {}).get('content'), handle)
+
+    def stream(self, path, payload, extract, handle=None):
+        """
+        POST a streaming request, yield the token extract() pulls out of each chunk, and record TTFT and prefill
+        handle.cancel() (or cancel() for every stream) aborts it from another thread, the generator then just ends
+        """
+        handle = handle or StreamHandle()
+        start = time.perf_counter()
+        first = True
+        with self.lock:
+            if handle.cancelled:
+                return
+            self.active.add(handle)
+        local.handle = handle
+        try:
+            with self.session.post(f"{self.base_url}{path}", json=payload, stream=True, timeout=OLLAMA_TIMEOUT) as response:
+                local.handle = None
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    try:
+                        chunk = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if chunk.get('done'):
+                        self.record_prefill(chunk)
+                        continue
+                    token = extract(chunk)
+                    if token:
+                        if first:
+                            first = False
+                            self.last_ttft = (time.perf_counter() - start) * 1000
+                            timer.record("ttft", self.last_ttft)
+                        yield token
+        except Exception:
+            # sending on or reading from a connection cancel() shut down underneath us
+            if handle.cancelled:
+                return
+            raise
+        finally:
+            local.handle = None
+            # the connection goes back to the pool, a late cancel() mustn't reach whichever request uses it next
+            handle.detach()
+            with self.lock:
+                self.active.discard(handle)
+
+    def cancel(self):
+        """
+        abort every streaming generation in flight by shutting down its connection
+        the server notices the client went away and stops generating, instead of running on to num_predict
+        """
+        with self.lock:
+            handles = list(self.active)
+            self.active.clear()
+        for handle in handles:
+            handle.cancel()
+        return len(handles)
+
+    def record_prefill(self, chunk):
+        """ollama reports the prompt tokens it had to evaluate, a reused cached prefix isn't counted"""
+        count = chunk.get("prompt_eval_count", 0)
+        elapsed = chunk.get("prompt_eval_duration", 0) / 1e6
+        self.last_prefill = (count, elapsed)
+        timer.record("prefill", elapsed) # printed (unless TIMER_QUIET) with the other measurements, the count stays in last_prefill
+
+    def warmup(self, messages=None):
+        """
+        load the model (and keep it loaded) with a one token generation, returns its time to first token
+        passing the chat messages also prefills the system prompt, so the first real turn reuses it
+        """
+        with timer.section("slm_warmup"):
+            tokens = self.chat_stream(messages, num_predict=1) if messages else self.generate_stream("Hi", num_predict=1)
+            for _ in tokens:
+                pass
+        return self.last_ttft
+
+    def close(self):
+        self.session.close()
+
+class StreamHandle:
+    """
+    one streaming request, cancel() aborts it from any thread: even while the server is still prefilling
+    (no reply yet, the sending thread is waiting for headers) shutting the socket down makes it give up
+    """
+    def __init__(self):
+        self.cancelled = False
+        self.connection = None # the pooled connection the request went out on, while it's in flight
+        self.lock = threading.Lock()
+
+    def attach(self, connection):
+        with self.lock:
+            self.connection = connection
+            cancelled = self.cancelled
+        if cancelled:
+            shutdown_connection(connection)
+
+    def detach(self):
+        with self.lock:
+            self.connection = None
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            connection = self.connection
+        if connection is not None:
+            shutdown_connection(connection)
+
+def shutdown_connection(connection):
+    """close a connection another thread is blocked on"""
+    # closing the socket alone doesn't wake a thread blocked reading it, shutting it down does
+    try:
+        if connection.sock is not None:
+            connection.sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+# the StreamHandle of the request the current thread is sending, picked up by TrackedConnection
+local = threading.local()
+
+class TrackedConnection(HTTPConnection):
+    """attaches itself to the sending thread's StreamHandle once the request is on the wire"""
+    def request(self, *args, **kwargs):
+        super().request(*args, **kwargs)
+        handle = getattr(local, "handle", None)
+        if handle is not None:
+            handle.attach(self)
+
+class TrackedConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TrackedConnection
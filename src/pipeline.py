@@ -1,19 +1,37 @@
 import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from src.models import Models
-from src.audio import AudioInterface
+from src.models import Models, FALLBACK_RESPONSE
+from src.audio import AudioInterface, INT16_SCALE
 from src.timing import timer
 from src.context import ContextManager
 from src.functions import Functions
-from src.config import INTERRUPT_POLL_INTERVAL, CHUNK_SIZE, VAD_THRESHOLD
+from src.vad import Endpointer
+from src.aec import EchoCanceller
+from src.playback import resample
+from src.speculate import SpeculativeResponse, normalize_transcript
+from src.cache import ResponseCache
+from src.turn import ResponseTurn
+from src.ollama import StreamHandle
+from src.metrics import MetricsExporter
+from src.profiler import SamplingProfiler
+from src.monitor import ResourceMonitor
+from src.config import (
+    CHUNK_SIZE, VAD_THRESHOLD, STREAMING_STT, SAMPLE_RATE, INTERRUPT_NOISE_RATIO, INTERRUPT_RAW_RATIO,
+    INTERRUPT_RAW_BASELINE_CHUNKS, INTERRUPT_CHUNKS,
+    CONTEXT_SUMMARY, SPECULATIVE_SLM, SPECULATE_MIN_SILENCE, CACHE_ENABLED, METRICS_ENABLED,
+    MONITOR_ENABLED
+)
 
 class Jarvis:
-    def __init__(self, chunk_size=CHUNK_SIZE, vad_threshold=VAD_THRESHOLD):
-        self.models = Models()
-        self.audio = AudioInterface()
-        self.context = ContextManager()
+    def __init__(self, chunk_size=CHUNK_SIZE, vad_threshold=VAD_THRESHOLD, models=None, audio=None):
+        self.models = models or Models()
+        self.audio = audio or AudioInterface()
+        self.context = ContextManager(summarizer=self.models.summarize if CONTEXT_SUMMARY else None)
         self.functions = Functions(self.models)
+        self.cache = ResponseCache() if CACHE_ENABLED else None
         self.chunk_size = chunk_size
         self.vad_threshold = vad_threshold
         self.wake_mode = False
@@ -24,104 +42,277 @@ class Jarvis:
         self.speaking_event = threading.Event() # flag for if TTS is playing
         self.interrupt_event = threading.Event() # flag for if interrupt is detected
         self.shutdown_event = threading.Event() # flag for shutdown
+        self.interrupt_thread = None
+        self.speculation = None # SLM response started on a stable partial transcript
+        self.last_partial = ""
+        self.interrupted_at = None # perf_counter() of the last barge-in, until the next listen starts
+        self.barge_in_pos = None # capture position right after the chunks the barge-in was detected on
+        self.barge_in_audio = None # those chunks with the echo cancelled (float32), the next recording starts with them
+        self.marks = {} # perf_counter() of the current turn's milestones (see metrics.MILESTONES)
+        self.response_source = None # where the current turn's response came from: "slm", "cache" or "function"
+        self.metrics = MetricsExporter() if METRICS_ENABLED else None
+        self.profiler = SamplingProfiler() # idle until started by --profile or SIGUSR1
+        self.monitor = ResourceMonitor(self.set_quality) if MONITOR_ENABLED else None
+
+        # the exact PCM we play is the echo canceller's reference, aligned on mic capture positions
+        self.echo_canceller = EchoCanceller()
+        self.models.on_playback_start = self.on_playback_start
+        self.models.on_playback_stop = lambda: self.echo_canceller.truncate_reference(self.audio.ring.write_pos)
         
-    def initialize(self):
-        self.models.load()
+    def initialize(self, wake_word=False):
+        """
+        get everything the first turn needs ready at once: the mic, Whisper, the Piper voice, the SLM on the server and
+        (in wake word mode) the wake model each start on their own thread. they're mostly native code or waiting on Ollama,
+        so they really do overlap
+        """
+        components = {
+            "audio": self.audio.start_capture,
+            "whisper": self.models.load_stt,
+            "voice": self.models.load_voice,
+            # in chat mode the warmup also leaves the system prompt in the server's KV cache
+            "slm": lambda: self.models.warmup_slm(self.context.build_messages("Hi") if self.context.mode == "chat" else None)
+        }
+        if wake_word:
+            components["wake_model"] = self.load_wake_detector
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(components), thread_name_prefix="startup") as pool:
+            futures = {name: pool.submit(self.start_component, name, load) for name, load in components.items()}
+        elapsed = {name: future.result() for name, future in futures.items()}
+        breakdown = ", ".join(f"{name} {ms:.0f}ms" for name, ms in sorted(elapsed.items(), key=lambda item: -item[1]))
+        print(f"Startup: {breakdown} (in parallel, {(time.perf_counter() - start) * 1000:.0f}ms wall)")
+        if self.monitor:
+            self.monitor.start()
+
+    def start_component(self, name, load):
+        """one part of initialize(), on a startup thread, returns how long it took in ms"""
+        with timer.section(f"startup_{name}") as span:
+            load()
+        return span.elapsed
+
+    def load_wake_detector(self):
+        from src.wake import WakeWordDetector
+        hop = self.monitor.settings["wake_hop"] if self.monitor else 1
+        self.wake_detector = WakeWordDetector(audio_interface=self.audio, hop=hop)
+
+    def set_quality(self, settings):
+        """apply a QUALITY_LEVELS entry picked by the resource monitor (called on its thread)"""
+        self.models.set_quality(settings["whisper_model"], settings["whisper_threads"], settings["num_predict"])
+        if self.wake_detector:
+            self.wake_detector.hop = settings["wake_hop"]
     
-    def detect_interrupt(self):
-        """used to monitor interrupts while speaking"""
-        # sample baseline noise based on TTS playback + background noise
-        baseline_samples = []
-        for i in range(3):
-            try: 
-                if not self.audio.stream:
-                    print("Audio stream not open")
-                    break
-                data = self.audio.stream.read(self.chunk_size, exception_on_overflow=False)
-                volume = np.abs(np.frombuffer(data, dtype=np.int16)).mean()
-                baseline_samples.append(volume)
-                time.sleep(0.05)
-            except OSError as e:
-                print(f"Audio read error during baseline sampling: {e}")
-            except Exception as e:
-                print(f"Unexpected error during baseline sampling: {e}")
+    def on_playback_start(self, pcm, delay):
+        """called for every PCM chunk queued on the output (at the voice's rate), delay is the seconds until it's heard"""
+        # the reference is lined up with the mic sample for sample, so it has to be at the capture rate
+        reference = resample(pcm, self.models.sample_rate, SAMPLE_RATE)
+        self.echo_canceller.add_reference(reference, self.audio.ring.write_pos + int(delay * SAMPLE_RATE))
+        self.marks.setdefault("first_audio", time.perf_counter() + delay)
 
-        if baseline_samples:
-            baseline = np.mean(baseline_samples)
-            threshold = max(baseline * 2.5, self.vad_threshold * 1000)
-        else:
-            threshold = self.vad_threshold * 1000
-        
-        # monitor for interrupts above threshold
+    def detect_interrupt(self, stop=None):
+        """used to monitor interrupts while speaking, stop() cuts the response off (stop_speaking by default)"""
+        # our own consumer of the shared capture thread, positioned at "now"
+        reader = self.audio.reader()
+        min_threshold = self.vad_threshold * 1000
+        noise_floor = None # residual level with playback in it, once the echo canceller has converged
+        raw_floor = 0.0 # raw mic level with playback in it, for while it hasn't
+        raw_chunks = 0
+        loud_chunks = 0
+        was_raw = False
+        recent = deque(maxlen=INTERRUPT_CHUNKS) # residuals of the latest chunks, the start of the user's words if they trigger
+        # the TTS echo is subtracted from the mic, so the residual is compared against its own noise floor.
+        # that floor is only learned from chunks with playback in them once the echo canceller has converged:
+        # seeded from the silence before the first token, or while the filter is still learning the echo path,
+        # the leftover echo alone would look like the user talking.
+        # until it converges (and whenever the echo path changes enough to knock it back out), the raw mic is
+        # checked against its own level during playback instead, a conservative check as before echo cancellation
         while self.speaking_event.is_set() and not self.shutdown_event.is_set():
             try:
-                if not self.audio.stream:
-                    print("Audio stream not open")
-                    break
-                data = self.audio.stream.read(self.chunk_size, exception_on_overflow=False)
-                volume = np.abs(np.frombuffer(data, dtype=np.int16)).mean()
+                pos = reader.pos
+                chunk = reader.read(self.chunk_size)
+                residual = self.echo_canceller.process(chunk, pos)
+                recent.append(residual)
+                echo = self.echo_canceller.echo_active
+                raw = echo and not self.echo_canceller.converged
+                if raw != was_raw:
+                    loud_chunks = 0
+                    was_raw = raw
+                if raw:
+                    volume = np.abs(chunk).mean()
+                    raw_chunks += 1
+                    if raw_chunks <= INTERRUPT_RAW_BASELINE_CHUNKS:
+                        # the echo lags the reference by the room's delay, its level is the loudest of the first few chunks
+                        raw_floor = max(raw_floor, volume)
+                        continue
+                    threshold = max(raw_floor * INTERRUPT_RAW_RATIO, min_threshold)
+                else:
+                    volume = np.abs(residual).mean()
+                    if noise_floor is None:
+                        if not echo:
+                            continue
+                        noise_floor = volume
+                    threshold = max(noise_floor * INTERRUPT_NOISE_RATIO, min_threshold)
                 if volume > threshold:
-                    print(f"\n**INTERRUPT OCCURRED {volume:.0f} > {threshold:.0f}**")
-                    self.interrupt_event.set()
-                    self.models.stop_speaking()
-                    return True
-            except OSError as e:
+                    loud_chunks += 1
+                    if loud_chunks >= INTERRUPT_CHUNKS:
+                        print(f"\n**INTERRUPT OCCURRED {volume:.0f} > {threshold:.0f}**")
+                        self.interrupted_at = time.perf_counter()
+                        # the raw mic still has the response's echo in it here, so these chunks are handed over echo-cancelled
+                        self.barge_in_audio = (np.concatenate(recent) * INT16_SCALE).astype(np.float32)
+                        self.barge_in_pos = pos + self.chunk_size
+                        self.interrupt_event.set()
+                        (stop or self.models.stop_speaking)()
+                        # free the CPU for the user's next turn instead of letting the server finish the response
+                        self.models.cancel_generation()
+                        return True
+                else:
+                    loud_chunks = 0
+                    if raw:
+                        # follows the loudest recent echo up at once and lets go slowly, so louder words don't trigger
+                        raw_floor = volume if volume > raw_floor else raw_floor + 0.05 * (volume - raw_floor)
+                    elif echo:
+                        # floor drops immediately and rises slowly, so speech doesn't drag it up
+                        noise_floor = volume if volume < noise_floor else noise_floor + 0.05 * (volume - noise_floor)
+            except (OSError, TimeoutError) as e:
                 print(f"Audio read error in interrupt: {e}")
                 break
             except Exception as e:
                 print(f"Unexpected error in interrupt: {e}")
                 break          
-            time.sleep(INTERRUPT_POLL_INTERVAL)
         return False
 
-    def speak_with_interrupts(self, text):
-        """run both TTS and interrupt monitoring in parallel"""
-        if not text:
-            return
-    
-        # main speaking portion
+    def arm_interrupts(self):
+        """reset the interrupt state for a response that is about to be spoken"""
         self.speaking_event.set() 
         self.interrupt_event.clear()
-        self.audio.start_recording()
-
-        interrupt_thread = threading.Thread(target=self.detect_interrupt, daemon=True)
-        interrupt_thread.start()
+        self.barge_in_pos = None
+        self.barge_in_audio = None
 
-        self.models.speak(text, wait = False) # run TTS in the background
-        while self.models.is_speaking():
-            if self.interrupt_event.is_set():
-                self.models.stop_speaking()
-                break
-            time.sleep(0.02) # check every 20ms
+    def start_speaking(self):
+        """start monitoring for interrupts, for a response that is about to be queued for TTS"""
+        self.arm_interrupts()
+        self.interrupt_thread = threading.Thread(target=self.detect_interrupt, daemon=True)
+        self.interrupt_thread.start()
 
+    def finish_speaking(self):
+        """wait for the queued speech to play out (an interrupt flushes it), then stop monitoring"""
+        self.models.wait_until_done_speaking()
         self.speaking_event.clear()
 
         # wait for interrupt thread to finish
-        interrupt_thread.join(timeout=0.5) 
-        if interrupt_thread.is_alive():
+        self.interrupt_thread.join(timeout=0.5) 
+        if self.interrupt_thread.is_alive():
             self.shutdown_event.set()
-            interrupt_thread.join(timeout=0.1)
-        self.audio.stop_recording()
-  
+            self.interrupt_thread.join(timeout=0.1)
+
+    def speak_with_interrupts(self, text):
+        """run both TTS and interrupt monitoring in parallel"""
+        if not text:
+            return
+        self.start_speaking()
+        self.models.speak(text, wait=False) # run TTS in the background
+        self.finish_speaking()
     
+    def listen(self, start_pos=None):
+        """
+        record the user's command and return its transcript (streamed while they're still talking if enabled)
+        after a barge-in recording starts from where the user began talking over the response
+        """
+        prefix, self.barge_in_audio = self.barge_in_audio, None
+        if start_pos is None:
+            start_pos, self.barge_in_pos = self.barge_in_pos, None
+        else:
+            prefix = None
+        self.marks = {}
+        self.response_source = None
+        transcriber = None
+        endpointer = Endpointer(self.chunk_size / SAMPLE_RATE)
+        self.cancel_speculation()
+        self.last_partial = ""
+        if STREAMING_STT:
+            def on_partial(text):
+                # partial transcripts let the endpointer tell a finished question from a mid-phrase pause
+                endpointer.set_transcript(text)
+                if text != self.last_partial:
+                    self.on_partial_transcript(text)
+                self.maybe_speculate(text, endpointer)
+                self.last_partial = text
+            transcriber = self.models.streaming_transcriber(on_partial=on_partial)
+            transcriber.start()
+        if self.interrupted_at is not None:
+            timer.record("interrupt_to_listen", (time.perf_counter() - self.interrupted_at) * 1000)
+            self.interrupted_at = None
+        audio_data = self.audio.record_until_silence(
+            start_pos=start_pos,
+            on_chunk=transcriber.feed if transcriber else None,
+            endpointer=endpointer,
+            prefix=prefix
+        )
+        self.marks["record_end"] = time.perf_counter()
+        if endpointer.any_speech_detected:
+            # the endpointer only fires after its silence hangover, the user stopped talking that long ago
+            self.marks["speech_end"] = self.marks["record_end"] - endpointer.silence
+        with timer.section("transcription"):
+            if transcriber is None:
+                prompt = self.models.transcribe(audio_data)
+            elif not audio_data.any():
+                # recorder returned its silence placeholder, don't let whisper hallucinate on noise
+                transcriber.cancel()
+                self.cancel_speculation()
+                prompt = ""
+            else:
+                prompt = transcriber.finish()
+        self.marks["stt_done"] = time.perf_counter()
+        if self.speculation and not self.speculation.matches(prompt):
+            print("Speculative response discarded, final transcript differs")
+            self.cancel_speculation()
+        return prompt
+
+    def maybe_speculate(self, text, endpointer):
+        """
+        start the SLM on a partial transcript once it has stopped changing and the user has gone quiet,
+        so its time to first token hides behind the endpointing silence
+        """
+        if not SPECULATIVE_SLM:
+            return
+        # unchanged since the previous incremental decode
+        stable = normalize_transcript(text) == normalize_transcript(self.last_partial)
+        if self.speculation and not self.speculation.matches(text):
+            self.cancel_speculation()
+        if self.speculation or not stable or not text.strip() or endpointer.silence < SPECULATE_MIN_SILENCE:
+            return
+        # timers, alarms, the time and shutdown never go to the SLM
+        if self.functions.matches(text) or "shut down" in text.lower():
+            return
+        print(f"Speculating on: {text}")
+        handle = StreamHandle()
+        self.speculation = SpeculativeResponse(text, self.slm_stream(text, handle=handle), handle=handle)
+
+    def cancel_speculation(self):
+        if self.speculation:
+            self.speculation.cancel()
+            self.speculation = None
+
+    def on_partial_transcript(self, text):
+        """called from the streaming transcriber with each new partial hypothesis"""
+        print(f"... {text}")
+
     def run_conversation_loop(self):
         """the full conversation loop"""
         print("\n**JARVIS STARTED**")
         while not self.shutdown_event.is_set():
             try:
+                timer.new_trace()
                 print("\nListening...")
-                audio_data = self.audio.record_until_silence()
-                with timer.section("transcription"):
-                    prompt = self.models.transcribe(audio_data)
-                    print(f"\nYou: {prompt}")
-                    if not prompt:
-                        print("No speech detected, not running SLM and Piper")
-                        continue
-                    if "shut down" in prompt.lower():
-                        print('Shutting down. Goodbye.')
-                        break
+                prompt = self.listen()
+                print(f"\nYou: {prompt}")
+                if not prompt:
+                    print("No speech detected, not running SLM and Piper")
+                    continue
+                if "shut down" in prompt.lower():
+                    print('Shutting down. Goodbye.')
+                    break
                 with timer.section("full_response"):
                     self.stream_and_speak(prompt)
+                self.end_turn()
                 timer.report()
             except Exception as e:
                 print(f"pipeline error: {e}")
@@ -132,69 +323,102 @@ class Jarvis:
         "stream tokens from the SLM and speak it in sentence-wise chunks"
         is_function, response = self.functions.parse(prompt)
         if is_function:
+            self.response_source = "function"
             print(f"Assistant: {response}")
             self.speak_with_interrupts(response)
             return
+        cacheable = self.cache is not None and self.cache.cacheable(prompt)
+        if cacheable:
+            cached = self.cache.get(prompt)
+            if cached:
+                self.response_source = "cache"
+                self.speak_cached(prompt, *cached)
+                return
+        self.response_source = "slm"
         print("Assistant: ", end="")
-        buffer = []
-        full_response = []
-        word_count = 0
-        sentence_pauses = {'.', '!', '?', ';'}
-        prompt_w_context = self.context.build_prompt(prompt)
-
-        with timer.section("slm_stream"):
-            for token in self.models.generate_stream(prompt_w_context):
-                print(token, end="", flush=True) # continuously print tokens on the same line
-                buffer.append(token)
-                full_response.append(token)
-                curr_response = ''.join(buffer)
-                words = curr_response.split()
-                should_speak = False
-                if curr_response.rstrip() and curr_response.rstrip()[-1] in sentence_pauses: 
-                    should_speak = True
-                elif len(words) - word_count > 10:
-                    should_speak = True
-                if should_speak and len(curr_response.strip()) > 0:
-                    self.speak_with_interrupts(curr_response.strip())
-                    buffer = []
-                    word_count += len(words)
-                    if self.interrupt_event.is_set():
-                        print("Stopped SLM generation due to interrupt")
-                        break
-        full_response = ''.join(full_response)
-        self.context.add_interaction(prompt, full_response)
-
-        if not self.interrupt_event.is_set():
-            # speak any remaining words
-            remaining_words = ''.join(buffer).strip()
-            if remaining_words:
-                self.speak_with_interrupts(remaining_words)
+        # SLM, segmenter, TTS and playback run as concurrent stages, with the interrupt detector watching alongside
+        self.arm_interrupts()
+        turn = ResponseTurn(self.models, self.response_stream(prompt), self.detect_interrupt, self.speaking_event.clear, marks=self.marks).run()
+        full_response = turn.text
+        # only complete answers are worth replaying
+        if cacheable and not turn.interrupted and turn.audio and full_response.strip() != FALLBACK_RESPONSE:
+            self.cache.put(prompt, full_response, turn.audio)
+        if turn.interrupted:
+            # the rest of the response was never heard, so the model shouldn't think it was said
+            self.context.add_interaction(prompt, turn.spoken_text, interrupted=True)
+        else:
+            self.context.add_interaction(prompt, full_response)
+
+    def end_turn(self):
+        """hand the finished turn to the metrics exporter, the profiler and the resource monitor"""
+        if self.metrics:
+            self.metrics.export(self.marks, source=self.response_source, interrupted=self.interrupt_event.is_set())
+        self.profiler.turn_done()
+        if self.monitor:
+            self.monitor.add_turn(self.marks)
+
+    def speak_cached(self, prompt, response, chunks):
+        """replay a cached response's audio, skipping the SLM and TTS"""
+        self.cancel_speculation()
+        print(f"Assistant: {response} (cached, {self.cache.stats()})")
+        output = self.models.output
+        start = output.written
+        self.start_speaking()
+        self.models.play(pcm for _, pcm in chunks)
+        self.finish_speaking()
+        if self.interrupt_event.is_set():
+            # like an SLM turn, only what had started playing was heard
+            played = (output.played - start) * self.models.sample_rate / output.device_rate
+            self.context.add_interaction(prompt, heard_text(chunks, played), interrupted=True)
+        else:
+            self.context.add_interaction(prompt, response)
     
-    def single_conversation(self):
+    def response_stream(self, prompt):
+        """SLM tokens for the prompt, picking up the speculative generation if it was started on this transcript"""
+        speculation, self.speculation = self.speculation, None
+        if speculation:
+            if speculation.matches(prompt):
+                print("(using speculative response)")
+                return speculation.tokens()
+            speculation.cancel()
+        return self.slm_stream(prompt)
+
+    def slm_stream(self, prompt, handle=None):
+        """stream SLM tokens for the prompt with conversation context"""
+        if self.context.mode == "chat":
+            return self.models.chat_stream(self.context.build_messages(prompt), handle=handle)
+        return self.models.generate_stream(self.context.build_prompt(prompt), handle=handle)
+
+    def single_conversation(self, start_pos=None):
         """ 
         run a single conversation cycle (for wake word mode)
+        start_pos is the capture position where the wake word ended, recording picks up from there
         returns True if should continue listening, False if user said 'shutdown'
         """
         self.conversation_active = True
 
         try:
-            with timer.section("recording"):
+            while True:
+                timer.new_trace()
                 print("\nListening...")
-                audio_data = self.audio.record_until_silence()   
-            with timer.section("transcription"):
-                prompt = self.models.transcribe(audio_data)
+                prompt = self.listen(start_pos=start_pos)
                 print(f"You: {prompt}")
-            if not prompt:
-                print("No speech detected, not running SLM and Piper")
-                self.conversation_active = False
-                return True
-            if "shut down" in prompt.lower():
-                print('Shutting down. Goodbye.')
-                self.shutdown_event.set()
-                return False
-            with timer.section("response"):
-                self.stream_and_speak(prompt)
-            timer.report()
+                if not prompt:
+                    print("No speech detected, not running SLM and Piper")
+                    self.conversation_active = False
+                    return True
+                if "shut down" in prompt.lower():
+                    print('Shutting down. Goodbye.')
+                    self.shutdown_event.set()
+                    return False
+                with timer.section("response"):
+                    self.stream_and_speak(prompt)
+                self.end_turn()
+                timer.report()
+                # the user talked over the response, listen to them without waiting for the wake word again
+                if not self.interrupt_event.is_set():
+                    break
+                start_pos = None
         except Exception as e:
             print(f"Error in conversation: {e}")
         finally:
@@ -203,15 +427,14 @@ class Jarvis:
 
     def run_with_wake_word(self):
         """Run Jarvis with wake word detection"""
-        from src.wake import WakeWordDetector
         print("**JARVIS STARTED (WAKE WORD MODE)**")
         self.wake_mode = True
         try:
-            self.wake_detector = WakeWordDetector(audio_interface=self.audio)
+            if self.wake_detector is None: # not already loaded by initialize(wake_word=True)
+                self.load_wake_detector()
             # start listening with single_conversation as callback
             self.wake_detector.start_listening(callback=self.single_conversation)
-            while not self.shutdown_event.is_set():
-                time.sleep(0.5)
+            self.shutdown_event.wait()
         except Exception as e:
             print(f"Error in wake word mode: {e}")
         finally:
@@ -222,12 +445,29 @@ class Jarvis:
 
         
     def shutdown(self):
+        self.profiler.stop(wait=True)
+        timer.report_percentiles()
         self.shutdown_event.set()
+        if self.monitor:
+            self.monitor.stop()
+        self.cancel_speculation()
         self.functions.shutdown()
         if self.wake_detector:
             self.wake_detector.stop_listening()
             self.wake_detector = None
         # give threads time to notice shutdown event
         time.sleep(0.1)  
+        self.models.shutdown()
         self.audio.shutdown()
-    
\ No newline at end of file
+    
+
+def heard_text(chunks, played):
+    """the text of the (text, pcm) chunks that had started playing within the first played samples"""
+    spoken = []
+    for text, pcm in chunks:
+        if played <= 0:
+            break
+        if not spoken or spoken[-1] is not text:
+            spoken.append(text)
+        played -= len(pcm)
+    return " ".join(spoken)
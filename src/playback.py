@@ -0,0 +1,135 @@
+import threading
+from collections import deque
+import numpy as np
+import pyaudio
+from src.config import OUTPUT_FRAMES_PER_BUFFER
+
+class OutputEngine:
+    """
+    an always-open PyAudio output stream fed from a PCM FIFO by the audio callback
+    start, finish and interrupt are signalled through events instead of being polled for, and stop()
+    takes effect at the next callback (one OUTPUT_FRAMES_PER_BUFFER buffer) with an exact count of samples played
+    """
+    def __init__(self, sample_rate, frames_per_buffer=OUTPUT_FRAMES_PER_BUFFER):
+        self.sample_rate = sample_rate # rate of the PCM handed to write()
+        self.device_rate = sample_rate
+        self.lock = threading.Lock()
+        self.chunks = deque() # [pcm, offset, on_done] at device rate
+        self.written = 0 # samples ever written (device rate)
+        self.played = 0 # samples ever played (device rate)
+        self.started = threading.Event() # set when audio starts coming out of the speaker
+        self.finished = threading.Event() # set when the FIFO has drained
+        self.interrupted = threading.Event() # set when playback was cut off by stop()
+        self.finished.set()
+        self.open(frames_per_buffer)
+
+    def open(self, frames_per_buffer):
+        self.pa = pyaudio.PyAudio()
+        self.device_rate = self.pick_device_rate(self.sample_rate)
+        self.stream = self.pa.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=self.device_rate,
+            output=True,
+            frames_per_buffer=frames_per_buffer,
+            stream_callback=self.callback
+        )
+        self.stream.start_stream()
+
+    def pick_device_rate(self, sample_rate):
+        """the voice's native rate if the output device takes it, the device's default rate otherwise"""
+        try:
+            device = self.pa.get_default_output_device_info()
+        except (IOError, ValueError):
+            return sample_rate # no default device to ask, let open() fail or pick one
+        try:
+            # raises ValueError rather than returning False when the format isn't supported
+            self.pa.is_format_supported(sample_rate, output_device=device["index"], output_channels=1, output_format=pyaudio.paInt16)
+            return sample_rate
+        except ValueError:
+            print(f"Output device doesn't support {sample_rate}Hz, resampling to {int(device['defaultSampleRate'])}Hz")
+            return int(device["defaultSampleRate"])
+
+    def resample(self, pcm):
+        """from the voice rate to the device rate (a no-op when they match)"""
+        return resample(pcm, self.sample_rate, self.device_rate)
+
+    def write(self, pcm, on_done=None):
+        """
+        queue int16 PCM behind whatever is playing, returns the seconds until it starts coming out
+        on_done(played) is called from the audio callback once it has played, or handed back by stop() if it's dropped
+        """
+        pcm = self.resample(pcm)
+        with self.lock:
+            queued = self.written - self.played
+            self.chunks.append([pcm, 0, on_done])
+            self.written += len(pcm)
+            if self.finished.is_set():
+                self.started.clear()
+                self.interrupted.clear()
+                self.finished.clear()
+        return queued / self.device_rate + self.output_latency()
+
+    def output_latency(self):
+        """seconds from a sample leaving the callback to it reaching the speaker"""
+        return self.stream.get_output_latency()
+
+    def callback(self, in_data, frame_count, time_info, status):
+        """PortAudio callback, pulls frame_count samples out of the FIFO (silence if it runs dry)"""
+        out = np.zeros(frame_count, dtype=np.int16)
+        filled = 0
+        done = []
+        with self.lock:
+            while filled < frame_count and self.chunks:
+                chunk = self.chunks[0]
+                pcm, offset, on_done = chunk
+                n = min(frame_count - filled, len(pcm) - offset)
+                out[filled:filled + n] = pcm[offset:offset + n]
+                filled += n
+                chunk[1] += n
+                if chunk[1] >= len(pcm):
+                    self.chunks.popleft()
+                    if on_done:
+                        done.append(on_done)
+            self.played += filled
+            if filled:
+                self.started.set()
+            drained = not self.chunks and not self.finished.is_set()
+            if drained:
+                self.finished.set()
+        for on_done in done:
+            on_done(True)
+        return (out.tobytes(), pyaudio.paContinue)
+
+    def stop(self):
+        """
+        drop everything that hasn't played yet
+        returns the dropped chunks' on_done callbacks, for the caller to run with False once it holds no locks
+        """
+        with self.lock:
+            dropped = [on_done for _, _, on_done in self.chunks if on_done]
+            if self.chunks:
+                self.interrupted.set()
+            self.chunks.clear()
+            self.written = self.played
+            self.finished.set()
+        return dropped
+
+    def busy(self):
+        return not self.finished.is_set()
+
+    def shutdown(self):
+        self.stop()
+        try:
+            self.stream.stop_stream()
+            self.stream.close()
+        finally:
+            self.pa.terminate()
+
+def resample(pcm, from_rate, to_rate):
+    """linear resample of int16 PCM (a no-op when the rates match)"""
+    if from_rate == to_rate or not len(pcm):
+        return pcm
+    num_out = int(len(pcm) * to_rate / from_rate)
+    x = np.linspace(0, len(pcm) - 1, num_out)
+    return np.interp(x, np.arange(len(pcm)), pcm).astype(np.int16)
@@ -0,0 +1,158 @@
+import os
+import signal
+import sys
+import threading
+import time
+from src.timing import timer
+from src.config import PROFILE_INTERVAL, PROFILE_TURNS, PROFILE_OUTPUT_DIR, PROFILE_MAX_DEPTH
+
+class SamplingProfiler:
+    """
+    wall-clock stack sampler for every thread, cheap enough to run on the Pi under load:
+    a daemon thread reads sys._current_frames() every interval and counts each stack, rooted at its thread and
+    the Timer sections open on it, then writes the counts as collapsed stacks (flamegraph.pl / speedscope input)
+    """
+    def __init__(self, interval=PROFILE_INTERVAL, output_dir=PROFILE_OUTPUT_DIR, max_depth=PROFILE_MAX_DEPTH):
+        self.interval = interval
+        self.output_dir = output_dir
+        self.max_depth = max_depth
+        self.stacks = {} # collapsed stack -> samples
+        self.labels = {} # code object -> frame label, so each function is only formatted once
+        self.samples = 0
+        self.cost = 0.0 # seconds spent taking samples
+        self.turns_left = None
+        self.path = None # where the last profile was written
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, turns=PROFILE_TURNS):
+        """sample until turns conversation turns have finished (None to sample until stop())"""
+        if self.running:
+            return
+        self.stacks = {}
+        self.samples = 0
+        self.cost = 0.0
+        self.turns_left = turns
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="profiler", daemon=True)
+        self.thread.start()
+        print(f"Profiling every {self.interval * 1000:.0f}ms" + (f" for {turns} turns" if turns else ""))
+
+    def stop(self, wait=False):
+        """stop sampling, the profile is written by the sampler thread as it exits"""
+        self.stop_event.set()
+        if wait and self.thread:
+            self.thread.join()
+
+    def toggle(self):
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+
+    def turn_done(self):
+        """count a finished turn, stops the profiler once it has seen enough of them"""
+        if not self.running or self.turns_left is None:
+            return
+        self.turns_left -= 1
+        if self.turns_left <= 0:
+            self.stop()
+
+    def run(self):
+        own = threading.get_ident()
+        start = next_time = time.perf_counter()
+        while not self.stop_event.is_set():
+            sample_start = time.perf_counter()
+            self.sample(own)
+            now = time.perf_counter()
+            self.cost += now - sample_start
+            self.samples += 1
+            # skip missed ticks instead of bursting to catch up when the CPU is saturated
+            next_time = max(next_time + self.interval, now)
+            self.stop_event.wait(next_time - now)
+        self.write(time.perf_counter() - start)
+
+    def sample(self, own):
+        frames = sys._current_frames()
+        sections = timer.current_spans()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in frames.items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                label = self.labels.get(code)
+                if label is None:
+                    label = self.labels[code] = frame_label(code)
+                stack.append(label)
+                frame = frame.f_back
+            if frame is not None:
+                stack.append("...")
+            stack.append(names.get(ident, str(ident)))
+            stack.reverse()
+            for i, section in enumerate(sections.get(ident, ()), 1):
+                stack.insert(i, f"[{section}]")
+            key = ";".join(stack)
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def write(self, duration):
+        if not self.stacks:
+            return
+        self.path = os.path.join(self.output_dir, time.strftime("profile-%Y%m%d-%H%M%S.folded"))
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            with open(self.path, "w") as f:
+                for stack, count in sorted(self.stacks.items()):
+                    f.write(f"{stack} {count}\n")
+        except OSError as e:
+            print(f"Profile write error: {e}")
+            return
+        print(f"Profile of {self.samples} samples over {duration:.1f}s written to {self.path}, "
+              f"sampling took {self.cost / max(duration, 1e-9) * 100:.1f}% of one core")
+        self.report()
+
+    def report(self, top=8):
+        """the Timer sections that most samples landed in (innermost section, summed over threads)"""
+        counts = {}
+        for stack, count in self.stacks.items():
+            sections = [frame for frame in stack.split(";") if frame.startswith("[")]
+            if sections:
+                counts[sections[-1]] = counts.get(sections[-1], 0) + count
+        total = sum(counts.values())
+        for section, count in sorted(counts.items(), key=lambda item: -item[1])[:top]:
+            print(f"  {section:<30}{count:>7} samples ({count / total * 100:.0f}%)")
+
+def frame_label(code):
+    """func (file.py:line) with ';' (the collapsed stack separator) kept out"""
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+def install_signal_handler(profiler):
+    """kill -USR1 <pid> starts the profiler for PROFILE_TURNS turns, or stops it early and writes what it has"""
+    if hasattr(signal, "SIGUSR1"): # not on Windows
+        signal.signal(signal.SIGUSR1, lambda signum, frame: profiler.toggle())
+
+# testing
+if __name__ == "__main__":
+    def busy(n):
+        return sum(i * i for i in range(n))
+
+    def worker():
+        with timer.section("worker"):
+            for _ in range(20):
+                busy(100000)
+
+    timer.quiet = True
+    profiler = SamplingProfiler()
+    profiler.start(turns=None)
+    thread = threading.Thread(target=worker, name="worker")
+    thread.start()
+    with timer.section("main"):
+        time.sleep(0.5)
+        busy(2000000)
+    thread.join()
+    profiler.stop(wait=True)
@@ -0,0 +1,149 @@
+import glob
+import os
+import threading
+import time
+import wave
+import numpy as np
+from src.audio import AudioInterface
+from src.timing import timer
+from src.config import SAMPLE_RATE, CHUNK_SIZE, OLLAMA_URL
+
+class ReplayAudioInterface(AudioInterface):
+    """
+    AudioInterface fed from recorded utterances instead of the microphone
+    the capture thread still fills the ring buffer chunk by chunk in real time (silence between utterances),
+    so recording, VAD, endpointing and interrupt detection run exactly as they do live
+    """
+    def __init__(self):
+        super().__init__()
+        self.pending = np.zeros(0, dtype=np.int16) # fed audio the capture thread hasn't reached yet
+        self.source_pos = 0 # samples handed to the capture thread so far
+        self.lock = threading.Lock()
+        self.next_chunk_time = None
+
+    def open_stream(self):
+        self.next_chunk_time = time.perf_counter()
+
+    def read_chunk(self):
+        """the next chunk of fed audio (zeros once it runs out), paced like a real microphone"""
+        self.next_chunk_time += CHUNK_SIZE / SAMPLE_RATE
+        time.sleep(max(0, self.next_chunk_time - time.perf_counter()))
+        chunk = np.zeros(CHUNK_SIZE, dtype=np.int16)
+        with self.lock:
+            n = min(CHUNK_SIZE, len(self.pending))
+            chunk[:n] = self.pending[:n]
+            self.pending = self.pending[n:]
+            self.source_pos += CHUNK_SIZE
+        return chunk
+
+    def feed(self, samples):
+        """queue int16 samples as if they were spoken into the mic, returns the capture position they start at"""
+        with self.lock:
+            start_pos = self.source_pos + len(self.pending)
+            self.pending = np.concatenate([self.pending, samples])
+        return start_pos
+
+def load_wav(path):
+    """a PCM WAV file as mono int16 at SAMPLE_RATE"""
+    with wave.open(path, "rb") as f:
+        if f.getsampwidth() != 2:
+            raise ValueError(f"{path} isn't 16-bit PCM")
+        channels = f.getnchannels()
+        rate = f.getframerate()
+        samples = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    if rate != SAMPLE_RATE:
+        num_out = int(len(samples) * SAMPLE_RATE / rate)
+        x = np.linspace(0, len(samples) - 1, num_out)
+        samples = np.interp(x, np.arange(len(samples)), samples).astype(np.int16)
+    return samples
+
+def write_wav(path, samples, sample_rate):
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(samples.astype(np.int16).tobytes())
+
+def run_replay(wav_dir, output_dir, mock=False, profile=None):
+    """
+    run every WAV utterance in wav_dir through the full pipeline (in name order), as a headless benchmark
+    each spoken response is written to output_dir/<utterance>.wav and a table of per-stage latencies is printed at the end
+    mock swaps Ollama and Piper for the local stand-ins in src/mock.py (Whisper still runs)
+    profile samples the stacks of the first that many utterances (see src/profiler.py)
+    """
+    from src.models import Models
+    from src.pipeline import Jarvis
+    from src.tts import voice_sample_rate
+    from src.mock import FakeOutput, FakeVoice, MockOllamaServer
+
+    paths = sorted(glob.glob(os.path.join(wav_dir, "*.wav")))
+    if not paths:
+        print(f"No .wav files in {wav_dir}")
+        return []
+    os.makedirs(output_dir, exist_ok=True)
+
+    server = MockOllamaServer().start() if mock else None
+    voice = FakeVoice() if mock else None
+    sample_rate = voice.sample_rate if voice else voice_sample_rate()
+    played = []
+    models = Models(ollama_url=server.url if server else OLLAMA_URL, voice=voice, output=FakeOutput(sample_rate, recording=played))
+    assistant = Jarvis(models=models, audio=ReplayAudioInterface())
+    results = []
+    if profile:
+        assistant.profiler.start(profile)
+    try:
+        with timer.section("startup"):
+            assistant.initialize()
+        for path in paths:
+            name = os.path.splitext(os.path.basename(path))[0]
+            timer.new_trace()
+            print(f"\nReplaying {name}")
+            start_pos = assistant.audio.feed(load_wav(path))
+            prompt = assistant.listen(start_pos=start_pos)
+            print(f"You: {prompt}")
+            if prompt:
+                with timer.section("response"):
+                    assistant.stream_and_speak(prompt)
+                assistant.end_turn()
+            timer.report()
+            # the turn has played out, so nothing is appending to played any more
+            if played:
+                write_wav(os.path.join(output_dir, f"{name}.wav"), np.concatenate(played), sample_rate)
+                played.clear()
+            results.append((name, prompt, dict(assistant.marks)))
+    finally:
+        assistant.shutdown()
+        if server:
+            server.stop()
+    print_latency_table(results)
+    return results
+
+# (column, from mark, to mark)
+LATENCY_COLUMNS = [
+    ("STT", "record_end", "stt_done"),
+    ("1st token", "stt_done", "first_token"),
+    ("1st audio", "first_token", "first_audio"),
+    ("total", "record_end", "first_audio")
+]
+
+def print_latency_table(results):
+    """per-utterance milliseconds between the turn milestones, then p50/p95 across utterances"""
+    columns = {title: [] for title, _, _ in LATENCY_COLUMNS}
+    print(f"\n{'utterance':<20} {'transcript':<32}" + "".join(f"{title:>11}" for title, _, _ in LATENCY_COLUMNS))
+    for name, prompt, marks in results:
+        row = f"{name[:20]:<20} {prompt[:32]:<32}"
+        for title, start, end in LATENCY_COLUMNS:
+            if start in marks and end in marks:
+                ms = (marks[end] - marks[start]) * 1000
+                columns[title].append(ms)
+                row += f"{ms:>9.0f}ms"
+            else:
+                row += f"{'-':>11}"
+        print(row)
+    for q in (50, 95):
+        row = f"{f'p{q}':<53}"
+        for title, _, _ in LATENCY_COLUMNS:
+            row += f"{np.percentile(columns[title], q):>9.0f}ms" if columns[title] else f"{'-':>11}"
+        print(row)
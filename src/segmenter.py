@@ -0,0 +1,125 @@
+from src.config import SEGMENT_FIRST_MIN_WORDS, SEGMENT_FIRST_MAX_WORDS, SEGMENT_MIN_WORDS, SEGMENT_SOFT_WORDS, SEGMENT_MAX_WORDS
+
+# words ending in a period that don't end a sentence
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "mt", "vs", "etc", "e.g", "i.e", "approx",
+    "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec", "a.m", "p.m"
+}
+# abbreviations only in front of a number ("No. 5"), otherwise they're words that can end a sentence ("No.")
+NUMBER_ABBREVIATIONS = {"no"}
+HARD_BREAKS = {".", "!", "?"}
+SOFT_BREAKS = {",", ";", ":"}
+CLOSING = "\"')]*"
+
+HARD = 2
+SOFT = 1
+UNLESS_NUMBER = 3 # HARD unless the next word is a number
+
+class SentenceSegmenter:
+    """
+    cuts a streamed SLM response into speakable chunks, one token at a time
+    each character is looked at once and a chunk is only joined when it's emitted, so a response costs O(n) overall.
+    a break is decided when the word after it starts (the whitespace), which is what tells "3." from "3.5"
+    the first chunk is kept short so speech starts early, later ones are allowed to run longer for better prosody
+    """
+    def __init__(self, first_min_words=SEGMENT_FIRST_MIN_WORDS, first_max_words=SEGMENT_FIRST_MAX_WORDS,
+                 min_words=SEGMENT_MIN_WORDS, soft_words=SEGMENT_SOFT_WORDS, max_words=SEGMENT_MAX_WORDS):
+        self.first_min_words = first_min_words # a clause break can end the first chunk after this many words
+        self.first_max_words = first_max_words # the first chunk is cut at a word boundary after this many
+        self.min_words = min_words # later sentences shorter than this are merged with the next one
+        self.soft_words = soft_words # a clause break can end a later chunk after this many words
+        self.max_words = max_words # later chunks are cut at a word boundary after this many
+        self.reset()
+
+    def reset(self):
+        self.parts = [] # characters of the chunk being built
+        self.word = [] # characters of the word being built
+        self.words = 0 # complete words in the chunk
+        self.emitted = 0 # chunks emitted so far
+        self.pending = False # the last word was UNLESS_NUMBER, decided by the next character
+
+    def feed(self, token):
+        """add a token, returns the chunks it completed (usually none)"""
+        chunks = []
+        for c in token:
+            if c.isspace():
+                if self.word:
+                    chunk = self.end_word()
+                    if chunk:
+                        chunks.append(chunk)
+                        continue
+                if self.parts:
+                    self.parts.append(c)
+            else:
+                if self.pending:
+                    self.pending = False
+                    chunk = None if c.isdigit() else self.cut(HARD)
+                    if chunk:
+                        chunks.append(chunk)
+                self.parts.append(c)
+                self.word.append(c)
+        return chunks
+
+    def flush(self):
+        """whatever is left at the end of the response"""
+        chunk = "".join(self.parts).strip()
+        self.parts = []
+        self.word = []
+        self.words = 0
+        self.pending = False
+        if chunk:
+            self.emitted += 1
+        return chunk
+
+    def end_word(self):
+        """a word just ended, returns the chunk if the policy says to cut here"""
+        kind = classify_break("".join(self.word))
+        self.word = []
+        self.words += 1
+        if kind == UNLESS_NUMBER:
+            self.pending = True
+            return None
+        return self.cut(kind)
+
+    def cut(self, kind):
+        """the chunk if the policy says to cut after a word with this kind of break, None otherwise"""
+        if self.emitted == 0:
+            cut = kind == HARD or (kind == SOFT and self.words >= self.first_min_words) or self.words >= self.first_max_words
+        else:
+            cut = (kind == HARD and self.words >= self.min_words) or (kind == SOFT and self.words >= self.soft_words) or self.words >= self.max_words
+        return self.flush() if cut else None
+
+def classify_break(word):
+    """HARD if a sentence ends after this word, SOFT for a clause break, UNLESS_NUMBER if the next word decides, None otherwise"""
+    word = word.rstrip(CLOSING)
+    if not word:
+        return None
+    if word.endswith("...") or word.endswith("…"):
+        # trailing off mid-thought, not the end of the sentence
+        return SOFT
+    last = word[-1]
+    if last in SOFT_BREAKS:
+        return SOFT
+    if last not in HARD_BREAKS:
+        return None
+    if last == ".":
+        core = word.rstrip(".").lstrip(CLOSING).lower()
+        if core in NUMBER_ABBREVIATIONS:
+            return UNLESS_NUMBER
+        # abbreviations, initials ("J.") and dotted acronyms ("U.S.")
+        if core in ABBREVIATIONS or (len(core) == 1 and core.isalpha()):
+            return None
+        if "." in core and all(len(piece) == 1 for piece in core.split(".")):
+            return None
+    return HARD
+
+# testing
+if __name__ == "__main__":
+    segmenter = SentenceSegmenter()
+    response = ("Sure! Dr. Smith said the dose is 3.5 mg, e.g. twice a day... but check first. "
+                "It's fine. No. 5 is the one. No. The U.S. guidelines, which were updated last year, say the same thing for adults and children over twelve.")
+    # feed it a few characters at a time like an SLM token stream
+    for i in range(0, len(response), 4):
+        for chunk in segmenter.feed(response[i:i + 4]):
+            print(f"[{chunk}]")
+    print(f"[{segmenter.flush()}]")
@@ -0,0 +1,67 @@
+import re
+import threading
+
+class SpeculativeResponse:
+    """
+    an SLM generation started on a partial transcript, before endpointing has fired
+    tokens are buffered in a background thread. if the final transcript matches, tokens() replays the buffer
+    and then follows the live stream, otherwise cancel() drops it
+    handle is the stream's ollama.StreamHandle, cancel() uses it to hang up on the server straight away
+    """
+    def __init__(self, transcript, token_stream, handle=None):
+        self.transcript = transcript
+        self.key = normalize_transcript(transcript)
+        self.token_stream = token_stream
+        self.handle = handle
+        self.buffer = []
+        self.done = False
+        self.cancelled = threading.Event()
+        self.new_token = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            for token in self.token_stream:
+                if self.cancelled.is_set():
+                    break
+                with self.new_token:
+                    self.buffer.append(token)
+                    self.new_token.notify_all()
+        except Exception as e:
+            print(f"Speculative generation error: {e}")
+        finally:
+            # closing the generator closes the HTTP response, so the server stops generating
+            self.token_stream.close()
+            with self.new_token:
+                self.done = True
+                self.new_token.notify_all()
+
+    def matches(self, transcript):
+        return normalize_transcript(transcript) == self.key
+
+    def cancel(self):
+        self.cancelled.set()
+        # without this the thread only notices at the next token, after the server has finished prefilling
+        if self.handle:
+            self.handle.cancel()
+
+    def tokens(self):
+        """every token generated so far, then the rest as it arrives"""
+        i = 0
+        try:
+            while True:
+                with self.new_token:
+                    self.new_token.wait_for(lambda: i < len(self.buffer) or self.done)
+                    if i >= len(self.buffer):
+                        return
+                    token = self.buffer[i]
+                i += 1
+                yield token
+        finally:
+            # the consumer stopped early (eg an interrupt), no point generating the rest
+            self.cancel()
+
+def normalize_transcript(text):
+    """case and punctuation insensitive form, whisper often only changes those between hypotheses"""
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
@@ -0,0 +1,166 @@
+import threading
+import numpy as np
+from src.timing import timer
+from src.config import SAMPLE_RATE, STREAMING_STT_STEP, STREAMING_STT_MIN_AUDIO
+
+class StreamingTranscriber:
+    """
+    incremental faster-whisper transcription that runs while the user is still speaking
+    a background thread decodes the growing window of uncommitted audio every STREAMING_STT_STEP seconds.
+    words that two consecutive hypotheses agree on are committed and the audio behind them is dropped,
+    so by the time endpointing fires only the last few words still need decoding
+    """
+    def __init__(self, whisper, on_partial=None, step=STREAMING_STT_STEP, min_audio=STREAMING_STT_MIN_AUDIO):
+        self.whisper = whisper
+        self.on_partial = on_partial
+        self.step_samples = int(step * SAMPLE_RATE)
+        self.min_samples = int(min_audio * SAMPLE_RATE)
+        self.lock = threading.Lock()
+        self.new_audio = threading.Event()
+        self.chunks = []
+        self.audio = np.zeros(0, dtype=np.float32) # uncommitted audio
+        self.audio_offset = 0.0 # seconds of audio dropped from the front of self.audio
+        self.decoded_samples = 0 # size of self.audio at the last decode
+        self.committed = [] # committed words
+        self.committed_end = 0.0 # absolute end time of the last committed word
+        self.tentative = [] # (start, end, word) of the last hypothesis past the committed words
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """start decoding in a background thread"""
+        self.running = True
+        self.thread = threading.Thread(target=self.decode_loop, name="stt_stream", daemon=True)
+        self.thread.start()
+
+    def feed(self, chunk):
+        """add a float32 chunk of mic audio, called from the recorder for every chunk (views are fine)"""
+        with self.lock:
+            self.chunks.append(chunk)
+        self.new_audio.set()
+
+    def take_audio(self):
+        """move fed chunks into the uncommitted window"""
+        with self.lock:
+            chunks, self.chunks = self.chunks, []
+        if chunks:
+            self.audio = np.concatenate([self.audio] + chunks)
+
+    def decode_loop(self):
+        """decode the uncommitted window whenever enough new audio has arrived"""
+        while self.running:
+            self.new_audio.wait(timeout=0.1)
+            self.new_audio.clear()
+            if not self.running:
+                break
+            self.take_audio()
+            if len(self.audio) < self.min_samples or len(self.audio) - self.decoded_samples < self.step_samples:
+                continue
+            try:
+                # a section of its own, so incremental decodes show in the percentiles and the profiler's report
+                with timer.section("stt_partial"):
+                    self.process_iteration()
+            except Exception as e:
+                print(f"Streaming STT error: {e}")
+
+    def decode(self):
+        """run whisper over the uncommitted window and return (start, end, word) with absolute times"""
+        self.decoded_samples = len(self.audio)
+        segments, info = self.whisper.transcribe(
+            self.audio,
+            beam_size=1,
+            best_of=1,
+            temperature=0.0,
+            condition_on_previous_text=False,
+            word_timestamps=True,
+            initial_prompt=" ".join(self.committed[-20:]) or None
+        )
+        words = []
+        for segment in segments:
+            for word in segment.words or []:
+                start = self.audio_offset + word.start
+                end = self.audio_offset + word.end
+                # whisper sometimes repeats a word that was already committed right at the cut
+                if end <= self.committed_end:
+                    continue
+                words.append((start, end, word.word.strip()))
+        return [w for w in words if w[2]]
+
+    def process_iteration(self):
+        """commit the prefix this hypothesis shares with the previous one and trim the audio behind it"""
+        hypothesis = self.decode()
+        agreed = 0
+        for (_, _, prev_word), (_, _, word) in zip(self.tentative, hypothesis):
+            if normalize_word(prev_word) != normalize_word(word):
+                break
+            agreed += 1
+        if agreed:
+            self.committed.extend(word for _, _, word in hypothesis[:agreed])
+            self.committed_end = hypothesis[agreed - 1][1]
+            self.trim(self.committed_end)
+        self.tentative = hypothesis[agreed:]
+        self.report_partial()
+
+    def trim(self, until):
+        """drop the audio before absolute time until"""
+        cut = int((until - self.audio_offset) * SAMPLE_RATE)
+        if cut <= 0:
+            return
+        cut = min(cut, len(self.audio))
+        self.audio = self.audio[cut:]
+        self.audio_offset += cut / SAMPLE_RATE
+        self.decoded_samples = max(0, self.decoded_samples - cut)
+
+    def report_partial(self):
+        """hand the current hypothesis to on_partial after every decode, unchanged ones included (that's how stability shows)"""
+        if not self.on_partial:
+            return
+        try:
+            self.on_partial(" ".join(self.committed + [word for _, _, word in self.tentative]))
+        except Exception as e:
+            print(f"Partial transcript callback error: {e}")
+
+    def stop(self):
+        self.running = False
+        self.new_audio.set()
+        if self.thread and self.thread.is_alive():
+            self.thread.join()
+        self.thread = None
+
+    @timer.measure("STT")
+    def finish(self):
+        """stop streaming and decode whatever is still uncommitted, returns the final transcript"""
+        self.stop()
+        self.take_audio()
+        # the last hypothesis is still current unless more audio arrived after it was decoded
+        if len(self.audio) > self.decoded_samples:
+            self.tentative = self.decode()
+        self.committed.extend(word for _, _, word in self.tentative)
+        self.tentative = []
+        return " ".join(self.committed).strip()
+
+    def cancel(self):
+        """stop streaming and throw the transcript away"""
+        self.stop()
+        self.committed = []
+        self.tentative = []
+
+def normalize_word(word):
+    return "".join(c for c in word.lower() if c.isalnum())
+
+# testing
+if __name__ == "__main__":
+    from faster_whisper import WhisperModel
+    from src.audio import AudioInterface
+    from src.config import WHISPER_MODEL
+    whisper = WhisperModel(WHISPER_MODEL, device="cpu", compute_type="int8", cpu_threads=2)
+    audio = AudioInterface()
+    try:
+        transcriber = StreamingTranscriber(whisper, on_partial=lambda text: print(f"... {text}"))
+        transcriber.start()
+        print("Say something (stops on silence):")
+        audio.record_until_silence(on_chunk=transcriber.feed)
+        print(f"Final: {transcriber.finish()}")
+        timer.report()
+    finally:
+        audio.shutdown()
@@ -1,51 +1,229 @@
+import itertools
+import math
+import threading
 import time
 from functools import wraps
 from contextlib import contextmanager
+from src.config import TIMER_QUIET, TIMER_MAX_SPANS
+
+class Span:
+    """one timed section: its parent is whatever section was open on the same thread when it started (or one handed to it)"""
+    __slots__ = ("id", "name", "parent", "thread", "start", "end")
+
+    def __init__(self, id, name, parent, thread, start, end=None):
+        self.id = id
+        self.name = name
+        self.parent = parent # id of the enclosing span, None at the top level
+        self.thread = thread # name of the thread it ran on
+        self.start = start
+        self.end = end
+
+    @property
+    def elapsed(self):
+        return (self.end - self.start) * 1000
+
+class Histogram:
+    """
+    fixed-memory latency histogram: log-spaced buckets ~5% wide from 0.1ms to ~100s,
+    so percentiles stay within a bucket of the truth however many samples are added
+    """
+    MIN_MS = 0.1
+    GROWTH = 1.05
+    BUCKETS = int(math.log(1e6) / math.log(GROWTH)) + 2
 
-class Timer:
     def __init__(self):
-        self.measurements = {}
-    
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, ms):
+        if ms <= self.MIN_MS:
+            i = 0
+        else:
+            i = min(self.BUCKETS - 1, int(math.log(ms / self.MIN_MS) / math.log(self.GROWTH)) + 1)
+        self.counts[i] += 1
+        self.count += 1
+        self.max = max(self.max, ms)
+
+    def percentile(self, q):
+        """upper edge of the bucket holding the q-th percentile (capped at the largest sample)"""
+        if not self.count:
+            return 0.0
+        target = q / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.MIN_MS * self.GROWTH ** i, self.max)
+        return self.max
+
+class Timer:
+    """
+    thread-safe timing of named sections
+    every measurement becomes a span in the current trace (one per conversation turn) with its thread and parent,
+    and goes into a per-name histogram for percentiles across turns. quiet skips the print on every measurement
+    """
+    def __init__(self, quiet=TIMER_QUIET, max_spans=TIMER_MAX_SPANS):
+        self.quiet = quiet
+        self.max_spans = max_spans
+        self.measurements = {} # latest ms for each name
+        self.histograms = {}
+        self.trace = [] # finished spans of the current turn
+        self.events = [] # (perf_counter, thread name, name, detail) of the current turn, see event()
+        self.stacks = {} # thread ident -> spans currently open on that thread
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def start_span(self, name, parent=None):
+        """parent overrides the enclosing span, for work handed off to another thread"""
+        stack = self.stacks.setdefault(threading.get_ident(), [])
+        if parent is None and stack:
+            parent = stack[-1]
+        span = Span(next(self.ids), name, parent.id if parent else None, threading.current_thread().name, time.perf_counter())
+        stack.append(span)
+        return span
+
+    def end_span(self, span):
+        span.end = time.perf_counter()
+        stack = self.stacks.get(threading.get_ident())
+        if stack and stack[-1] is span:
+            stack.pop()
+        elif stack and span in stack:
+            stack.remove(span)
+        self.add(span)
+
+    def add(self, span):
+        elapsed = span.elapsed
+        with self.lock:
+            self.measurements[span.name] = elapsed
+            histogram = self.histograms.get(span.name)
+            if histogram is None:
+                histogram = self.histograms[span.name] = Histogram()
+            histogram.add(elapsed)
+            if len(self.trace) < self.max_spans:
+                self.trace.append(span)
+        if not self.quiet:
+            print(f"[{span.name}] {elapsed:.0f}ms")
+
     def measure(self, name):
         """a decorator for timing functions"""
         def decorator(func):
             @wraps(func)
             def wrapper(*args, **kwargs):
-                start = time.perf_counter()
-                result = func(*args, **kwargs)
-                elapsed = (time.perf_counter() - start) * 1000
-                self.measurements[name] = elapsed
-                print(f"[{name}] {elapsed:.0f}ms")
-                return result
+                span = self.start_span(name)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.end_span(span)
             return wrapper
         return decorator
-    
+
     @contextmanager
     def section(self, name):
         """a context manager for timing blocks of code"""
-        start = time.perf_counter()
-        yield
-        elapsed = (time.perf_counter() - start) * 1000
-        self.measurements[name] = elapsed
-        print(f"[{name}] {elapsed:.0f}ms")
-    
+        span = self.start_span(name)
+        try:
+            yield span
+        finally:
+            self.end_span(span)
+
+    def record(self, name, elapsed):
+        """record a measurement (in ms) that was timed elsewhere, it's placed inside whatever section is open on this thread"""
+        stack = self.stacks.get(threading.get_ident())
+        end = time.perf_counter()
+        span = Span(next(self.ids), name, stack[-1].id if stack else None, threading.current_thread().name, end - elapsed / 1000, end)
+        self.add(span)
+
+    def event(self, name, detail):
+        """log a decision or state change (not a duration), it's printed and kept with the current trace"""
+        with self.lock:
+            if len(self.events) < self.max_spans:
+                self.events.append((time.perf_counter(), threading.current_thread().name, name, detail))
+        print(f"[{name}] {detail}")
+
+    def current(self):
+        """the innermost span open on this thread, None if there isn't one"""
+        stack = self.stacks.get(threading.get_ident())
+        return stack[-1] if stack else None
+
+    def current_spans(self):
+        """thread ident -> names of the sections open on it, outermost first (read from any thread)"""
+        return {ident: [span.name for span in stack] for ident, stack in list(self.stacks.items()) if stack}
+
+    def new_trace(self):
+        """start a new turn's trace, returns the spans of the previous one"""
+        with self.lock:
+            trace, self.trace = self.trace, []
+            self.events = []
+        return trace
+
     def report(self):
-        """print all the measurements"""
-        if self.measurements:
-            sum_of_all_times = sum(self.measurements.values())
-            for name, ms in self.measurements.items():
-                print(f"{name}: {ms:.0f}ms ({ms/sum_of_all_times*100:.0f}%)")
+        """print the current trace as a tree, each span as a share of its parent"""
+        with self.lock:
+            spans = sorted(self.trace, key=lambda span: span.start)
+            events = list(self.events)
+        by_id = {span.id: span for span in spans}
+        children = {}
+        for span in spans:
+            parent = span.parent if span.parent in by_id else None
+            children.setdefault(parent, []).append(span)
 
-# testing 
+        def show(span, depth, parent):
+            line = f"{'  ' * depth}{span.name}: {span.elapsed:.0f}ms"
+            if parent and parent.elapsed > 0:
+                line += f" ({span.elapsed / parent.elapsed * 100:.0f}%)"
+            if span.thread != (parent.thread if parent else "MainThread"):
+                line += f" [{span.thread}]"
+            print(line)
+            for child in children.get(span.id, []):
+                show(child, depth + 1, span)
+
+        for span in children.get(None, []):
+            show(span, 0, None)
+        for _, thread, name, detail in events:
+            print(f"{name}: {detail} [{thread}]")
+
+    def percentiles(self, *quantiles):
+        """name -> (count, [ms at each quantile]) across every measurement so far"""
+        quantiles = quantiles or (50, 95, 99)
+        with self.lock:
+            return {name: (h.count, [h.percentile(q) for q in quantiles]) for name, h in self.histograms.items()}
+
+    def report_percentiles(self):
+        stats = self.percentiles(50, 95, 99)
+        if not stats:
+            return
+        print(f"\n{'stage':<24}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for name, (count, values) in sorted(stats.items()):
+            print(f"{name:<24}{count:>7}" + "".join(f"{v:>8.0f}ms" for v in values))
+
+# testing
 timer = Timer()
 if __name__ == "__main__":
     @timer.measure("my_func")
     def my_func():
         time.sleep(0.2)
         return "done"
-    my_func()
-    
+
+    def in_thread():
+        with timer.section("in_thread"):
+            time.sleep(0.05)
+
     with timer.section("my_block"):
-        time.sleep(0.05)
+        my_func()
+        worker = threading.Thread(target=in_thread)
+        worker.start()
+        with timer.section("nested"):
+            time.sleep(0.05)
+            timer.record("timed_elsewhere", 30)
+            timer.event("decision", "something changed")
+        worker.join()
 
-    timer.report()
\ No newline at end of file
+    timer.report()
+    timer.quiet = True
+    start = time.perf_counter()
+    for _ in range(10000):
+        with timer.section("overhead"):
+            pass
+    print(f"overhead {(time.perf_counter() - start) / 10000 * 1e6:.1f}us per section")
+    timer.report_percentiles()
@@ -0,0 +1,134 @@
+import json
+import subprocess
+import numpy as np
+from src.config import PIPER_VOICE_PATH, PIPER_NUM_THREADS, TTS_MIN_CHUNK_PHONEMES
+
+# special symbols in a Piper voice's phoneme_id_map
+PAD = "_"
+BOS = "^"
+EOS = "$"
+CLAUSE_BREAKS = {",", ";", ":"}
+
+class PiperVoice:
+    """
+    in-process Piper synthesis through onnxruntime
+    the voice model is loaded once and the session stays warm, so a sentence costs one inference
+    instead of a process start plus model load
+    """
+    def __init__(self, model_path=PIPER_VOICE_PATH, config_path=None, num_threads=PIPER_NUM_THREADS):
+        import onnxruntime as ort
+        with open(config_path or f"{model_path}.json", encoding="utf-8") as f:
+            config = json.load(f)
+        self.sample_rate = config["audio"]["sample_rate"]
+        self.espeak_voice = config["espeak"]["voice"]
+        self.phoneme_id_map = config["phoneme_id_map"]
+        self.phoneme_map = config.get("phoneme_map", {})
+        self.num_speakers = config.get("num_speakers", 1)
+        inference = config.get("inference", {})
+        self.scales = np.array([
+            inference.get("noise_scale", 0.667),
+            inference.get("length_scale", 1.0),
+            inference.get("noise_w", 0.8)
+        ], dtype=np.float32)
+
+        # keep Piper to its own thread budget so it doesn't fight Whisper for cores
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.phonemize_espeak = load_phonemizer()
+
+    def phonemize(self, text):
+        """text -> a list of phoneme lists, one per sentence"""
+        if self.phonemize_espeak:
+            sentences = self.phonemize_espeak(text, self.espeak_voice)
+        else:
+            # no piper_phonemize, fall back to the espeak-ng CLI (costs a process start per call)
+            output = subprocess.run(
+                ["espeak-ng", "-q", "--ipa", "-v", self.espeak_voice, text],
+                capture_output=True, text=True, check=True
+            ).stdout
+            sentences = [list(line.strip()) for line in output.splitlines() if line.strip()]
+        return [[p for ph in sentence for p in self.phoneme_map.get(ph, [ph])] for sentence in sentences]
+
+    def phoneme_ids(self, phonemes):
+        """phonemes -> model input ids, same layout as piper's phonemes_to_ids"""
+        ids = list(self.phoneme_id_map[BOS])
+        for phoneme in phonemes:
+            if phoneme not in self.phoneme_id_map:
+                continue
+            ids.extend(self.phoneme_id_map[phoneme])
+            ids.extend(self.phoneme_id_map[PAD])
+        ids.extend(self.phoneme_id_map[EOS])
+        return ids
+
+    def synthesize_ids(self, phoneme_ids):
+        """run the model on one sentence of phoneme ids, returns int16 PCM"""
+        text = np.array([phoneme_ids], dtype=np.int64)
+        inputs = {
+            "input": text,
+            "input_lengths": np.array([text.shape[1]], dtype=np.int64),
+            "scales": self.scales
+        }
+        if self.num_speakers > 1:
+            inputs["sid"] = np.array([0], dtype=np.int64)
+        audio = self.session.run(None, inputs)[0].squeeze()
+        # piper peak-normalizes every sentence
+        audio = audio * (32767.0 / max(0.01, float(np.max(np.abs(audio)))))
+        return np.clip(audio, -32768, 32767).astype(np.int16)
+
+    def synthesize(self, text):
+        """text -> int16 PCM at self.sample_rate"""
+        chunks = list(self.synthesize_stream(text))
+        if not chunks:
+            return np.zeros(0, dtype=np.int16)
+        return np.concatenate(chunks)
+
+    def synthesize_stream(self, text, min_chunk_phonemes=TTS_MIN_CHUNK_PHONEMES):
+        """
+        text -> int16 PCM chunks, yielded as soon as each one is synthesized
+        long sentences are cut at clause punctuation so the first audio doesn't wait for the whole sentence
+        """
+        for phonemes in self.phonemize(text):
+            for clause in split_clauses(phonemes, min_chunk_phonemes):
+                yield self.synthesize_ids(self.phoneme_ids(clause))
+
+def voice_sample_rate(model_path=PIPER_VOICE_PATH, config_path=None):
+    """read a voice's native sample rate from its .onnx.json without loading the model"""
+    with open(config_path or f"{model_path}.json", encoding="utf-8") as f:
+        return json.load(f)["audio"]["sample_rate"]
+
+def split_clauses(phonemes, min_phonemes):
+    """cut a sentence's phonemes after , ; : once a piece is at least min_phonemes long"""
+    clauses = []
+    start = 0
+    for i, phoneme in enumerate(phonemes):
+        if phoneme in CLAUSE_BREAKS and i + 1 - start >= min_phonemes:
+            clauses.append(phonemes[start:i + 1])
+            start = i + 1
+    # a short tail is folded into the previous clause rather than synthesized on its own
+    tail = phonemes[start:]
+    if clauses and len(tail) < min_phonemes:
+        clauses[-1] = clauses[-1] + tail
+    elif tail:
+        clauses.append(tail)
+    return clauses
+
+def load_phonemizer():
+    """piper_phonemize's espeak binding if it's installed, None otherwise"""
+    try:
+        from piper_phonemize import phonemize_espeak
+        return phonemize_espeak
+    except ImportError:
+        print("piper_phonemize not installed, phonemizing with the espeak-ng CLI")
+        return None
+
+# testing
+if __name__ == "__main__":
+    import time
+    voice = PiperVoice()
+    for sentence in ["Hello, testing in-process Piper.", "The second sentence skips the model load."]:
+        start = time.perf_counter()
+        pcm = voice.synthesize(sentence)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{len(pcm) / voice.sample_rate:.1f}s of audio in {elapsed:.0f}ms")
@@ -0,0 +1,199 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.timing import timer
+from src.segmenter import SentenceSegmenter
+from src.config import TURN_TEXT_QUEUE_SIZE, TURN_OUTPUT_CHUNKS_AHEAD, TTS_PREFETCH_SENTENCES
+
+class Interrupted(Exception):
+    """raised inside a turn when the user barges in, cancels every stage"""
+
+class ResponseTurn:
+    """
+    one streamed response as asyncio stages joined by bounded queues:
+    SLM tokens -> segmenter -> TTS -> playback, with the interrupt watcher running alongside.
+    every blocking call (the token stream, synthesis, the mic) runs on its stage's own executor thread,
+    a full queue makes the stage before it wait, and all stages share one TaskGroup so a barge-in cancels the whole turn.
+    the slm_stream and TTS Timer sections are opened on those threads, under the section open where run() was called
+    """
+    def __init__(self, models, tokens, watch, stop_watching, marks=None, text_queue_size=TURN_TEXT_QUEUE_SIZE,
+                 audio_queue_size=TTS_PREFETCH_SENTENCES, chunks_ahead=TURN_OUTPUT_CHUNKS_AHEAD):
+        self.models = models
+        self.tokens = tokens
+        self.watch = watch # blocking, watch(stop) calls stop() to cut the response off and returns True if the user barged in
+        self.stop_watching = stop_watching # makes watch() return once the response has played
+        self.text_queue_size = text_queue_size
+        self.audio_queue_size = audio_queue_size
+        self.chunks_ahead = chunks_ahead
+        self.response = [] # every token generated
+        self.spoken = [] # texts that have (at least partly) played, ie what the user heard
+        self.audio = [] # every PCM chunk synthesized, as (text, pcm)
+        self.interrupted = False
+        self.stopped = False # set by stop(), nothing more is queued on the output after it
+        self.lock = threading.Lock() # between stop() on the watch thread and queueing audio on the event loop
+        self.marks = {} if marks is None else marks # perf_counter() of first_token, first_segment and first_synth
+        self.stats = {"slm": [0.0, 0.0], "tts": [0.0, 0.0], "playback": [0.0, 0.0]} # stage -> [ms busy, ms waiting on the next stage]
+        self.executors = {name: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"turn_{name}") for name in ("slm", "tts", "watch")}
+        self.parent = None # the Timer span open on the thread that called run()
+
+    @property
+    def text(self):
+        return "".join(self.response)
+
+    @property
+    def spoken_text(self):
+        return " ".join(self.spoken)
+
+    def run(self):
+        """run the turn until it has played out or been interrupted, returns self"""
+        self.parent = timer.current()
+        try:
+            asyncio.run(self.stages())
+        finally:
+            self.stop_watching()
+            for executor in self.executors.values():
+                executor.shutdown(wait=False)
+        self.report()
+        return self
+
+    async def stages(self):
+        text_queue = asyncio.Queue(maxsize=self.text_queue_size)
+        audio_queue = asyncio.Queue(maxsize=self.audio_queue_size)
+        try:
+            async with asyncio.TaskGroup() as group:
+                group.create_task(self.slm_stage(text_queue))
+                group.create_task(self.tts_stage(text_queue, audio_queue))
+                group.create_task(self.playback_stage(audio_queue))
+                group.create_task(self.watch_stage())
+        except* Interrupted:
+            self.interrupted = True
+
+    async def blocking(self, stage, fn, *args):
+        """run a blocking call on the stage's executor thread"""
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executors[stage], fn, *args)
+        finally:
+            if stage in self.stats:
+                self.stats[stage][0] += (time.perf_counter() - start) * 1000
+
+    def open_section(self, stage, name):
+        """
+        start a Timer section on the stage's executor thread, it stays open across the stage's blocking calls until
+        close_section (the one worker runs them in order), so the spans and profiler samples on it are attributed
+        """
+        return self.executors[stage].submit(timer.start_span, name, self.parent)
+
+    def close_section(self, stage, opened):
+        self.executors[stage].submit(lambda: timer.end_span(opened.result()))
+
+    def mark(self, milestone):
+        self.marks.setdefault(milestone, time.perf_counter())
+
+    async def put(self, stage, q, item):
+        """hand an item to the next stage, waiting (backpressure) while its queue is full"""
+        start = time.perf_counter()
+        await q.put(item)
+        self.stats[stage][1] += (time.perf_counter() - start) * 1000
+
+    async def slm_stage(self, text_queue):
+        """tokens -> speakable chunks"""
+        tokens = iter(self.tokens)
+        segmenter = SentenceSegmenter()
+        opened = self.open_section("slm", "slm_stream")
+        try:
+            while (token := await self.blocking("slm", next, tokens, None)) is not None:
+                self.mark("first_token")
+                print(token, end="", flush=True) # continuously print tokens on the same line
+                self.response.append(token)
+                for chunk in segmenter.feed(token):
+                    self.mark("first_segment")
+                    await self.put("slm", text_queue, chunk)
+            chunk = segmenter.flush()
+            if chunk:
+                self.mark("first_segment")
+                await self.put("slm", text_queue, chunk)
+            await self.put("slm", text_queue, None)
+        finally:
+            # queued behind any next() still running on the thread, closing a running generator would fail
+            if hasattr(tokens, "close"):
+                self.executors["slm"].submit(tokens.close)
+            self.close_section("slm", opened)
+
+    async def tts_stage(self, text_queue, audio_queue):
+        """chunks -> PCM, clause by clause"""
+        while (text := await text_queue.get()) is not None:
+            pcm_chunks = iter(self.models.synthesize_stream(text))
+            opened = self.open_section("tts", "TTS")
+            try:
+                while (pcm := await self.blocking("tts", next, pcm_chunks, None)) is not None:
+                    self.mark("first_synth")
+                    self.audio.append((text, pcm))
+                    await self.put("tts", audio_queue, (text, pcm))
+            except Exception as e:
+                print(f"TTS error: {e}")
+            finally:
+                self.executors["tts"].submit(pcm_chunks.close)
+                self.close_section("tts", opened)
+        await self.put("tts", audio_queue, None)
+
+    async def playback_stage(self, audio_queue):
+        """PCM -> output, keeping at most chunks_ahead chunks queued on it"""
+        loop = asyncio.get_running_loop()
+        self.room = asyncio.Semaphore(self.chunks_ahead)
+        self.playing = 0
+        self.drained = asyncio.Event()
+        while (item := await audio_queue.get()) is not None:
+            text, pcm = item
+            start = time.perf_counter()
+            await self.room.acquire()
+            self.stats["playback"][1] += (time.perf_counter() - start) * 1000
+            with self.lock:
+                if self.stopped:
+                    return # the flush already ran, the Interrupted from watch_stage is on its way
+                self.playing += 1
+                self.drained.clear()
+                # where the chunk starts on the output, tells whether a flush cut it off partway or before it began
+                position = self.models.output.written
+                self.models.start_playback(pcm, self.on_done(loop, text, position))
+        if self.playing:
+            await self.drained.wait()
+        self.stop_watching()
+
+    def on_done(self, loop, text, position):
+        """output callback for one chunk, runs chunk_done on the event loop"""
+        def done(played):
+            try:
+                loop.call_soon_threadsafe(self.chunk_done, text, position, played)
+            except RuntimeError:
+                pass # dropped after the turn already ended
+        return done
+
+    def chunk_done(self, text, position, played):
+        self.room.release()
+        self.playing -= 1
+        # a flushed chunk was still heard in part if the output had got past its start
+        heard = played or position < self.models.output.played
+        if heard and (not self.spoken or self.spoken[-1] is not text):
+            self.spoken.append(text)
+        if not self.playing:
+            self.drained.set()
+
+    def stop(self):
+        """
+        cut the response off (called on the watch thread on a barge-in). the flush wakes playback_stage through the
+        dropped chunks' callbacks before the watch returns, so it's marked stopped first or the next chunk would be queued
+        """
+        with self.lock:
+            self.stopped = True
+        self.models.stop_speaking()
+
+    async def watch_stage(self):
+        """the interrupt detector, for as long as the response is playing"""
+        if await self.blocking("watch", self.watch, self.stop):
+            raise Interrupted()
+
+    def report(self):
+        stages = ", ".join(f"{name} {busy:.0f}ms busy/{waiting:.0f}ms waiting" for name, (busy, waiting) in self.stats.items())
+        print(f"\nTurn stages: {stages}")
@@ -0,0 +1,112 @@
+import os
+import re
+import numpy as np
+from src.config import (
+    SAMPLE_RATE, VAD_BACKEND, VAD_THRESHOLD, VAD_MODEL_PATH, SILERO_THRESHOLD,
+    MIN_SILENCE_DURATION, SILENCE_DURATION, MAX_SILENCE_DURATION
+)
+
+class EnergyVAD:
+    """the original loudness check, mean absolute amplitude against VAD_THRESHOLD * 1000"""
+    def __init__(self, threshold=VAD_THRESHOLD * 1000):
+        self.threshold = threshold / 32768.0 # chunks arrive as float32 in [-1, 1]
+
+    def is_speech(self, chunk):
+        """chunk is a float32 view of mic audio"""
+        return np.abs(chunk).mean() >= self.threshold
+
+    def reset(self):
+        pass
+
+class SileroVAD:
+    """silero VAD (v5 onnx export) run through onnxruntime, robust to steady background noise"""
+    WINDOW = 512 # samples per inference at 16 kHz
+    CONTEXT = 64 # samples of the previous window the model expects in front of each window
+
+    def __init__(self, model_path=VAD_MODEL_PATH, threshold=SILERO_THRESHOLD):
+        import onnxruntime as ort
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"VAD model not found at {model_path}")
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = 1
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.threshold = threshold
+        self.sr = np.array(SAMPLE_RATE, dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        """clear the recurrent state between recordings"""
+        self.state = np.zeros((2, 1, 128), dtype=np.float32)
+        self.context = np.zeros(self.CONTEXT, dtype=np.float32)
+        self.pending = np.zeros(0, dtype=np.float32)
+
+    def is_speech(self, chunk):
+        """chunk is a float32 view of mic audio, returns True if any 512 sample window in it is speech"""
+        audio = np.concatenate((self.pending, chunk))
+        speech = False
+        num_windows = len(audio) // self.WINDOW
+        for i in range(num_windows):
+            window = audio[i * self.WINDOW:(i + 1) * self.WINDOW]
+            x = np.concatenate((self.context, window))[np.newaxis, :]
+            prob, self.state = self.session.run(None, {"input": x, "state": self.state, "sr": self.sr})
+            self.context = window[-self.CONTEXT:]
+            if prob.item() >= self.threshold:
+                speech = True
+        self.pending = audio[num_windows * self.WINDOW:]
+        return speech
+
+def make_vad(backend=VAD_BACKEND):
+    """build the configured VAD backend, falling back to the energy VAD if the model can't be loaded"""
+    if backend == "silero":
+        try:
+            return SileroVAD()
+        except Exception as e:
+            print(f"Silero VAD unavailable ({e}), falling back to energy VAD")
+    return EnergyVAD()
+
+# an utterance ending in one of these is almost certainly not finished ("set a timer for...")
+CONTINUATION_WORDS = {
+    "and", "or", "but", "so", "because", "the", "a", "an", "to", "for", "of", "in", "on", "at",
+    "with", "my", "your", "is", "are", "what", "how", "um", "uh", "like", "set", "about"
+}
+
+class Endpointer:
+    """
+    decides when the user has finished speaking, with a silence hangover that adapts to what was said
+    after a complete sounding utterance only MIN_SILENCE_DURATION is needed, mid-phrase it waits up to MAX_SILENCE_DURATION,
+    and SILENCE_DURATION is used when there's no transcript to go on
+    """
+    def __init__(self, chunk_seconds, min_silence=MIN_SILENCE_DURATION, default_silence=SILENCE_DURATION, max_silence=MAX_SILENCE_DURATION):
+        self.chunk_seconds = chunk_seconds
+        self.min_silence = min_silence
+        self.default_silence = default_silence
+        self.max_silence = max_silence
+        self.transcript = ""
+        self.any_speech_detected = False
+        self.silence = 0.0
+
+    def set_transcript(self, text):
+        """latest partial transcript from streaming STT (may be called from another thread)"""
+        self.transcript = text
+
+    def hangover(self):
+        """how much trailing silence ends the utterance right now"""
+        text = self.transcript.strip()
+        if not text:
+            return self.default_silence
+        last_word = re.sub(r"[^a-z']", "", text.split()[-1].lower())
+        if text.endswith(",") or last_word in CONTINUATION_WORDS:
+            return self.max_silence
+        if text[-1] in ".?!":
+            return self.min_silence
+        return self.default_silence
+
+    def update(self, is_speech):
+        """feed one chunk's VAD decision, returns True once the utterance has ended"""
+        if is_speech:
+            self.any_speech_detected = True
+            self.silence = 0.0
+            return False
+        self.silence += self.chunk_seconds
+        return self.any_speech_detected and self.silence >= self.hangover()